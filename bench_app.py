@@ -0,0 +1,354 @@
+"""
+End-to-end benchmark for RoutingApp, driven by synthetic Ryu events.
+
+Feeds EventSwitchEnter, EventLinkAdd and EventHostAdd straight into the
+app's handlers, with a stub datapath that counts (and serializes) every
+OpenFlow message and answers barriers like an instant switch. No Mininet or
+Open vSwitch needed, but Ryu itself must be importable.
+
+For every topology/size/mode it records:
+  - bring-up: time to process all discovery events
+  - compute_paths latency, cold and cached
+  - install_proactive_flows: messages by type, bytes, time to the last barrier
+  - convergence after failing one link (event to last barrier reply)
+  - peak RSS; every scenario runs in a fresh process so the numbers are per scenario
+  - with --check-failover: every host pair walked over the installed tables
+    with each switch link down in turn, as the switches forward before the
+    controller reacts; any forwarding loop fails the run
+
+Hosts are spread over at most --max-hosts switches (fat-trees use their edge
+switches): the route set grows with the square of the host count.
+
+Example:
+  python3 bench_app.py --topologies nsfnet fattree --sizes 20 80 --output results.json
+  python3 bench_app.py --sizes 10 100 1000 5000 --compare baseline.json
+  python3 bench_app.py --topologies waxman geometric --sizes 30 60 --check-failover
+"""
+import argparse
+import ipaddress
+import json
+import multiprocessing
+import resource
+import struct
+import sys
+import time
+import types
+
+from bench_routing import fat_tree_arity, synthetic_edges
+
+OFPT_BARRIER_REQUEST = 20  # OpenFlow 1.3 message type numbers
+MSG_TYPES = {14: 'flow_mod', 15: 'group_mod', 18: 'multipart_request', 20: 'barrier'}
+# Metrics --compare checks; lower is better for all of them
+REGRESSION_KEYS = ('bringup_s', 'compute_cold_s', 'install_s', 'convergence_ms', 'peak_rss_mb')
+
+
+class StubDatapath(object):
+    """Datapath stand-in: counts messages and acknowledges barriers right away."""
+
+    def __init__(self, app, dpid):
+        from ryu.ofproto import ofproto_v1_3, ofproto_v1_3_parser
+        self.app = app
+        self.id = dpid
+        self.ofproto = ofproto_v1_3
+        self.ofproto_parser = ofproto_v1_3_parser
+        self.xid = 0
+        self.messages = {}  # message type name -> count
+        self.bytes = 0
+        self.writes = 0
+
+    def set_xid(self, msg):
+        self.xid += 1
+        msg.set_xid(self.xid)
+        return self.xid
+
+    def send_msg(self, msg):
+        if msg.xid is None:
+            self.set_xid(msg)
+        msg.serialize()
+        return self.send(msg.buf)
+
+    def send(self, buf):
+        from ryu.lib import hub
+        self.writes += 1
+        self.bytes += len(buf)
+        offset = 0
+        while offset < len(buf):
+            _, msg_type, length, xid = struct.unpack_from('!BBHI', buf, offset)
+            name = MSG_TYPES.get(msg_type, str(msg_type))
+            self.messages[name] = self.messages.get(name, 0) + 1
+            if msg_type == OFPT_BARRIER_REQUEST:
+                reply = types.SimpleNamespace(msg=types.SimpleNamespace(datapath=self, xid=xid))
+                hub.spawn(self.app.barrier_reply_handler, reply)
+            offset += length
+        return True
+
+
+def _mac(i):
+    return ':'.join('%02x' % ((i >> s) & 0xff) for s in (40, 32, 24, 16, 8, 0))
+
+
+def host_switches(kind, switches, max_hosts):
+    if kind == 'fattree':
+        k = fat_tree_arity(len(switches))
+        candidates = switches[-k * k // 2:]  # edge switches
+    else:
+        candidates = switches
+    step = max(1, -(-len(candidates) // max_hosts))
+    return candidates[::step][:max_hosts]
+
+
+def _totals(dps):
+    messages = {}
+    for dp in dps.values():
+        for name, count in dp.messages.items():
+            messages[name] = messages.get(name, 0) + count
+    return messages, sum(dp.bytes for dp in dps.values())
+
+
+def _table_action(table, src_mac, dst_mac, dst_ip):
+    # Same precedence as the switch: exact (src, dst) rule, then per-destination, then IPv4 prefixes
+    from ryu_routing_app import FLOW_PRIORITY
+    action = table.get((FLOW_PRIORITY + 1, (('eth_dst', dst_mac), ('eth_src', src_mac))))
+    if action is None:
+        action = table.get((FLOW_PRIORITY, (('eth_dst', dst_mac),)))
+    if action is None and dst_ip:
+        for (_, match), candidate in table.items():
+            prefix = dict(match).get('ipv4_dst')
+            if prefix is not None and ipaddress.ip_address(dst_ip) in ipaddress.ip_network(
+                    prefix if isinstance(prefix, str) else '/'.join(prefix)):
+                return candidate
+    return action
+
+
+def replay_link_failures(app):
+    """Walk every host pair over the installed tables with each switch link down in turn.
+
+    Models the data plane before the controller reacts: fast-failover groups
+    move to their backup port, select groups use any live bucket. Returns
+    (cases, loops, drops), counting (failed link, host pair) cases whose
+    packets can cycle or have nowhere to go.
+    """
+    from routing_engine import host_attachments, is_host_node
+    nodes = app.net.nodes
+    hosts = host_attachments(app.net)
+    links = sorted({(min(u, v), max(u, v)) for u, v in app.ports if not is_host_node(v)})
+    cases = loops = drops = 0
+    for u, v in links:
+        dead = {(u, app.ports[(u, v)]), (v, app.ports.get((v, u)))}
+        for src, src_sw in hosts:
+            for dst, _ in hosts:
+                if src == dst:
+                    continue
+                cases += 1
+                src_mac, dst_mac, dst_ip = nodes[src]['mac'], nodes[dst]['mac'], nodes[dst].get('ip')
+                # DFS over the switches the packet can reach; a grey node seen again is a loop
+                state = {src_sw: 'grey'}
+                stack = [(src_sw, None)]
+                looped = dropped = False
+                while stack and not looped:
+                    sw, ports = stack[-1]
+                    if ports is None:
+                        action = _table_action(app.flow_tables.get(sw, {}), src_mac, dst_mac, dst_ip)
+                        if action is None:
+                            ports = []
+                        elif action[0] == 'output':
+                            ports = [action[1]]
+                        elif action[0] == 'ff':
+                            ports = [port for port in action[1:] if (sw, port) not in dead][:1]
+                        else:
+                            ports = [port for port, _ in action[1] if (sw, port) not in dead]
+                        if not ports or any((sw, port) in dead for port in ports):
+                            dropped = True
+                        ports = [port for port in ports if (sw, port) not in dead]
+                        stack[-1] = (sw, ports)
+                    if not ports:
+                        state[sw] = 'black'
+                        stack.pop()
+                        continue
+                    nbr = app.port_neighbors.get((sw, ports.pop()))
+                    if nbr == dst:
+                        continue
+                    if nbr is None or is_host_node(nbr):
+                        dropped = True
+                    elif state.get(nbr) == 'grey':
+                        looped = True
+                    elif nbr not in state:
+                        state[nbr] = 'grey'
+                        stack.append((nbr, None))
+                loops += looped
+                drops += dropped and not looped
+    return cases, loops, drops
+
+
+def run_scenario(kind, n, mode, max_hosts, seed, check_failover=False):
+    """Bring up one topology in a fresh RoutingApp and measure it; returns a result row."""
+    from ryu.app.wsgi import WSGIApplication
+    from ryu.lib import hub
+    from ryu.ofproto import ofproto_v1_3, ofproto_v1_3_parser as parser
+    from ryu.topology import event
+    from ryu.topology.switches import Host, Link, Port, Switch
+    import ryu_routing_app
+
+    edges = synthetic_edges(kind, n, seed)
+    switches = sorted({s for a, b, _ in edges for s in (a, b)})
+    app = ryu_routing_app.RoutingApp(wsgi=WSGIApplication())
+    app.logger.disabled = True
+    app.set_mode(mode)
+    dps = {dpid: StubDatapath(app, dpid) for dpid in switches}
+    next_port = {dpid: 2 for dpid in switches}  # port 1 is kept for the host
+
+    def port(dpid, port_no):
+        ofpport = parser.OFPPort(port_no, '00:00:00:00:00:00', b'p', 0, 0, 0, 0, 0, 0, 0, 0)
+        return Port(dpid, ofproto_v1_3, ofpport)
+
+    links = []
+    for a, b, bw in edges:
+        pa, pb = next_port[a], next_port[b]
+        next_port[a] += 1
+        next_port[b] += 1
+        for src, sp, dst, dport in ((a, pa, b, pb), (b, pb, a, pa)):
+            link = Link(port(src, sp), port(dst, dport))
+            link.bw = bw
+            links.append(link)
+    hosts = []
+    for i, dpid in enumerate(host_switches(kind, switches, max_hosts)):
+        host = Host(_mac(i + 1), port(dpid, 1))
+        host.ipv4 = ['10.%d.%d.%d' % ((i + 1) >> 16, ((i + 1) >> 8) & 0xff, (i + 1) & 0xff)]
+        hosts.append(host)
+
+    start = time.perf_counter()
+    for dpid in switches:
+        app.switch_enter_handler(event.EventSwitchEnter(Switch(dps[dpid])))
+    for link in links:
+        app.link_add_handler(event.EventLinkAdd(link))
+    for host in hosts:
+        app.host_add_handler(event.EventHostAdd(host))
+    bringup = time.perf_counter() - start
+    baseline_msgs, baseline_bytes = _totals(dps)
+
+    start = time.perf_counter()
+    routes = app.compute_paths()
+    compute_cold = time.perf_counter() - start
+    start = time.perf_counter()
+    app.compute_paths()
+    compute_cached = time.perf_counter() - start
+
+    start = time.perf_counter()
+    install = app.install_proactive_flows()
+    complete = install.wait()
+    install_s = time.perf_counter() - start
+    messages, sent_bytes = _totals(dps)
+    install_msgs = {name: count - baseline_msgs.get(name, 0) for name, count in messages.items()}
+    failover = replay_link_failures(app) if check_failover else (None, None, None)
+
+    # Fail the link carried by the most routes and wait for the debounced reroute
+    usage = {}
+    for path in routes.values():
+        for u, v in zip(path[1:-2], path[2:-1]):
+            key = (min(u, v), max(u, v))
+            usage[key] = usage.get(key, 0) + 1
+    convergence = {}
+    if usage:
+        u, v = max(usage, key=lambda k: (usage[k], k))
+        reroutes = app.convergence['reroutes']
+        for src, dst in ((u, v), (v, u)):
+            app.link_delete_handler(event.EventLinkDelete(Link(port(src, app.ports.get((src, dst), 0)),
+                                                               port(dst, app.ports.get((dst, src), 0)))))
+        deadline = time.time() + ryu_routing_app.INSTALL_TIMEOUT + 5
+        while app.convergence['reroutes'] == reroutes and time.time() < deadline:
+            hub.sleep(0.01)
+        convergence = dict(app.convergence, failed_link=[u, v], routes_on_link=usage[(u, v)])
+
+    return {
+        'topology': kind, 'switches': len(switches), 'links': len(edges), 'hosts': len(hosts),
+        'mode': mode, 'backend': app.backend, 'pairs': len(routes),
+        'bringup_s': bringup, 'events': len(switches) + len(links) + len(hosts),
+        'compute_cold_s': compute_cold, 'compute_cached_s': compute_cached,
+        'install_s': install_s, 'install_complete': complete, 'install_messages': install_msgs,
+        'install_bytes': sent_bytes - baseline_bytes, 'rules': install.rules,
+        'convergence_ms': convergence.get('last_ms'),
+        'convergence_flow_mods': convergence.get('last_flow_mods'),
+        'debounce_ms': ryu_routing_app.REROUTE_DEBOUNCE * 1000.0,
+        'failed_link': convergence.get('failed_link'),
+        'failover_cases': failover[0], 'failover_loops': failover[1], 'failover_drops': failover[2],
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+    }
+
+
+def run(kinds, sizes, modes, max_hosts, seed, check_failover=False):
+    rows = []
+    ctx = multiprocessing.get_context('spawn')
+    for kind in kinds:
+        for n in ([14] if kind == 'nsfnet' else sizes):
+            for mode in modes:
+                # A fresh process per scenario keeps peak RSS (and caches) independent
+                with ctx.Pool(1) as pool:
+                    rows.append(pool.apply(run_scenario, (kind, n, mode, max_hosts, seed, check_failover)))
+                r = rows[-1]
+                converge = r['convergence_ms'] if r['convergence_ms'] is not None else float('nan')
+                print(f"{r['topology']:<10}{r['switches']:>9}{r['hosts']:>7}  {r['mode']:<14}"
+                      f"{r['bringup_s']:>11.2f}{r['compute_cold_s']:>11.3f}{r['install_s']:>11.3f}"
+                      f"{r['install_messages'].get('flow_mod', 0):>10}{converge:>13.1f}"
+                      f"{r['peak_rss_mb']:>9.1f}", flush=True)
+                if check_failover:
+                    print(f"  failover replay: {r['failover_cases']} cases, {r['failover_loops']} loops, "
+                          f"{r['failover_drops']} drops", flush=True)
+    return rows
+
+
+def compare(rows, baseline, tolerance):
+    """Regressions of ``rows`` against a previous --output file, as readable strings."""
+    def key(r):
+        return (r['topology'], r['switches'], r['mode'])
+    previous = {key(r): r for r in baseline}
+    problems = []
+    for row in rows:
+        old = previous.get(key(row))
+        if old is None:
+            continue
+        for metric in REGRESSION_KEYS:
+            new_value, old_value = row.get(metric), old.get(metric)
+            if new_value is None or not old_value:
+                continue
+            if new_value > old_value * (1 + tolerance):
+                problems.append(f"{row['topology']} n={row['switches']} {row['mode']}: "
+                                f"{metric} {old_value:.4g} -> {new_value:.4g}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--topologies', nargs='+', default=['nsfnet', 'fattree', 'geometric', 'waxman'])
+    parser.add_argument('--sizes', nargs='+', type=int, default=[10, 100, 1000])
+    parser.add_argument('--modes', nargs='+', default=['dijkstra_bw'])
+    parser.add_argument('--max-hosts', type=int, default=64)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--compare', help='previous --output file; exit 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed relative slowdown for --compare (default 0.25)')
+    parser.add_argument('--check-failover', action='store_true',
+                        help='replay single link failures over the installed tables; exit 1 on loops')
+    args = parser.parse_args()
+
+    print(f"{'topology':<10}{'switches':>9}{'hosts':>7}  {'mode':<14}{'bringup s':>11}{'compute s':>11}"
+          f"{'install s':>11}{'FlowMods':>10}{'converge ms':>13}{'RSS MB':>9}")
+    rows = run(args.topologies, args.sizes, args.modes, args.max_hosts, args.seed, args.check_failover)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'seed': args.seed,
+                       'max_hosts': args.max_hosts, 'results': rows}, f, indent=1)
+    if args.compare:
+        with open(args.compare) as f:
+            problems = compare(rows, json.load(f)['results'], args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            sys.exit(1)
+    if any(r['failover_loops'] for r in rows):
+        print("FAILOVER LOOPS: fast-failover backups send packets back into a cycle")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+"""
+Offline benchmark for the routing engines in routing_engine.py.
+
+Builds synthetic topologies shaped like RoutingApp.net (integer dpids,
+'host-<mac>' nodes, weight=1/bw) and times the original per-pair engine
+against the single-source tree engine. With --backend-sizes it also
+compares the NetworkX and CSR topology backends (latency and memory of
+all-source shortest paths). No Ryu or Mininet needed.
+
+Example:
+  python3 bench_routing.py --sizes 14 50 100 --hosts-per-switch 2
+  python3 bench_routing.py --topologies waxman --backend-sizes 1000 2000
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+import networkx as nx
+
+from routing_engine import MODES, ShortestPathTree, pairwise_routes, tree_routes, weight_key
+
+NSFNET_EDGES = [
+    (1, 2, 50), (1, 3, 50), (2, 4, 50), (3, 4, 50), (2, 5, 30), (4, 6, 30),
+    (5, 6, 40), (5, 7, 20), (6, 8, 20), (7, 9, 30), (8, 9, 30), (8, 10, 40),
+    (9, 11, 25), (10, 11, 25), (10, 12, 50), (11, 13, 50), (12, 13, 60), (12, 14, 60), (13, 14, 70)
+]
+BANDWIDTHS = (10, 20, 25, 30, 40, 50, 60, 70, 100)
+
+
+def build_graph(edges, hosts_per_switch=1):
+    """Return a DiGraph laid out like RoutingApp.net from (a, b, bw) edges."""
+    net = nx.DiGraph()
+    switches = sorted({n for a, b, _ in edges for n in (a, b)})
+    for dpid in switches:
+        net.add_node(dpid, type='switch')
+    for a, b, bw in edges:
+        weight = 1.0 / float(bw)
+        # Idle links: the load-aware weight equals the static one
+        net.add_edge(a, b, weight=weight, bw=bw, load_weight=weight)
+        net.add_edge(b, a, weight=weight, bw=bw, load_weight=weight)
+    count = 0
+    for dpid in switches:
+        for _ in range(hosts_per_switch):
+            count += 1
+            mac = ':'.join('%02x' % ((count >> s) & 0xff) for s in (40, 32, 24, 16, 8, 0))
+            host_node = f"host-{mac}"
+            net.add_node(host_node, type='host', mac=mac, ip=None)
+            net.add_edge(host_node, dpid, weight=0, load_weight=0)
+            net.add_edge(dpid, host_node, weight=0, load_weight=0)
+    return net
+
+
+def fat_tree_arity(n):
+    """Smallest even k whose fat-tree (5k^2/4 switches) has at least n switches."""
+    k = 4
+    while 5 * k * k // 4 < n:
+        k += 2
+    return k
+
+
+def fat_tree_edges(k, bw=100):
+    """k-ary fat-tree: (k/2)^2 core switches, then per pod k/2 aggregation and k/2 edge switches.
+
+    Dpids are numbered core, aggregation, edge, so the k^2/2 edge switches
+    (where hosts attach) are the highest ones.
+    """
+    half = k // 2
+    n_core = half * half
+    agg = lambda pod, i: n_core + pod * half + i + 1
+    edge = lambda pod, i: n_core + k * half + pod * half + i + 1
+    edges = []
+    for pod in range(k):
+        for i in range(half):
+            for j in range(half):
+                edges.append((edge(pod, i), agg(pod, j), bw))
+                edges.append((agg(pod, i), i * half + j + 1, bw))
+    return edges
+
+
+def synthetic_edges(kind, n, seed=0):
+    """Connected synthetic switch graphs with random link bandwidths."""
+    rng = random.Random(seed)
+    if kind == 'nsfnet':
+        return list(NSFNET_EDGES)
+    if kind == 'fattree':
+        return fat_tree_edges(fat_tree_arity(n))
+    if kind == 'waxman':
+        g = nx.waxman_graph(n, beta=0.4, alpha=0.2, seed=seed)
+    elif kind == 'geometric':
+        g = nx.random_geometric_graph(n, radius=min(1.0, 2.2 / n ** 0.5), seed=seed)
+    else:
+        g = nx.connected_watts_strogatz_graph(n, 4, 0.2, seed=seed)
+    # Stitch components together so every host pair is routable
+    comps = [sorted(c) for c in nx.connected_components(g)]
+    for left, right in zip(comps, comps[1:]):
+        g.add_edge(left[0], right[0])
+    return [(a + 1, b + 1, rng.choice(BANDWIDTHS)) for a, b in g.edges()]
+
+
+def _time(fn, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def _same_cost(graph, mode, a, b):
+    key = weight_key(mode)
+    if key is None:
+        return len(a) == len(b)
+    return abs(nx.path_weight(graph, a, key) - nx.path_weight(graph, b, key)) < 1e-9
+
+
+def run(kinds, sizes, hosts_per_switch, repeat, seed):
+    rows = []
+    for kind in kinds:
+        for n in ([14] if kind == 'nsfnet' else sizes):
+            graph = build_graph(synthetic_edges(kind, n, seed), hosts_per_switch)
+            for mode in MODES:
+                t_pair, ref = _time(lambda: pairwise_routes(graph, mode), repeat)
+                t_tree, routes = _time(lambda: tree_routes(graph, mode), repeat)
+                if set(ref) != set(routes) or not all(_same_cost(graph, mode, ref[k], routes[k]) for k in ref):
+                    raise RuntimeError(f"engines disagree on {kind} n={n} mode={mode}")
+                rows.append({
+                    'topology': kind, 'switches': n, 'pairs': len(routes), 'mode': mode,
+                    'pairwise_s': t_pair, 'tree_s': t_tree, 'speedup': t_pair / t_tree if t_tree else 0.0,
+                })
+    return rows
+
+
+def _measure(fn):
+    # Time an untraced run first; tracemalloc slows pure-Python code a lot
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    result = fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def run_backends(kinds, sizes, seed):
+    """All-source shortest paths on the NetworkX vs CSR backends."""
+    from topology_csr import CSRTopology
+
+    rows = []
+    for kind in kinds:
+        for n in ([14] if kind == 'nsfnet' else sizes):
+            edges = synthetic_edges(kind, n, seed)
+            t_nx_build, m_nx_build, graph = _measure(lambda: build_graph(edges, 0))
+            t_csr_build, m_csr_build, topo = _measure(lambda: CSRTopology.from_graph(graph))
+            switches = list(graph.nodes())
+            for mode in MODES:
+                t_nx, m_nx, _ = _measure(lambda: [ShortestPathTree.build(graph, s, mode) for s in switches])
+                t_csr, m_csr, _ = _measure(lambda: topo.shortest_paths(mode))
+                rows.append({
+                    'topology': kind, 'switches': n, 'links': len(edges), 'mode': mode,
+                    'nx_build_s': t_nx_build, 'nx_graph_bytes': m_nx_build,
+                    'csr_build_s': t_csr_build, 'csr_bytes': topo.nbytes,
+                    'nx_allpairs_s': t_nx, 'nx_peak_bytes': m_nx,
+                    'csr_allpairs_s': t_csr, 'csr_peak_bytes': m_csr,
+                })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--topologies', nargs='+', default=['nsfnet', 'smallworld', 'waxman', 'geometric'])
+    parser.add_argument('--sizes', nargs='+', type=int, default=[14, 50, 100])
+    parser.add_argument('--hosts-per-switch', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--backend-sizes', nargs='+', type=int, default=[],
+                        help='switch counts for the NetworkX vs CSR backend comparison')
+    args = parser.parse_args()
+
+    if args.backend_sizes:
+        rows = run_backends(args.topologies, args.backend_sizes, args.seed)
+        print(f"{'topology':<11}{'switches':>9}{'links':>7}  {'mode':<14}{'graph MB':>9}{'csr MB':>8}"
+              f"{'nx s':>8}{'nx peak MB':>11}{'csr s':>8}{'csr peak MB':>12}")
+        for r in rows:
+            print(f"{r['topology']:<11}{r['switches']:>9}{r['links']:>7}  {r['mode']:<14}"
+                  f"{r['nx_graph_bytes'] / 2 ** 20:>9.2f}{r['csr_bytes'] / 2 ** 20:>8.3f}"
+                  f"{r['nx_allpairs_s']:>8.2f}{r['nx_peak_bytes'] / 2 ** 20:>11.1f}"
+                  f"{r['csr_allpairs_s']:>8.2f}{r['csr_peak_bytes'] / 2 ** 20:>12.1f}")
+        return
+
+    rows = run(args.topologies, args.sizes, args.hosts_per_switch, args.repeat, args.seed)
+    print(f"{'topology':<11}{'switches':>9}{'pairs':>9}  {'mode':<14}{'pairwise ms':>12}{'tree ms':>10}{'speedup':>9}")
+    for r in rows:
+        print(f"{r['topology']:<11}{r['switches']:>9}{r['pairs']:>9}  {r['mode']:<14}"
+              f"{r['pairwise_s'] * 1e3:>12.1f}{r['tree_s'] * 1e3:>10.2f}{r['speedup']:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
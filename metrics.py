@@ -0,0 +1,144 @@
+"""
+Minimal Prometheus-style metrics for the Ryu app and the FastAPI proxy.
+
+Counters, gauges and histograms keep plain dicts keyed by label values, so
+recording a sample is a dict lookup and an add (histograms also bisect the
+bucket bounds); the text exposition format is only built when /metrics is
+scraped. No prometheus_client needed. Neither Ryu's green threads nor the
+asyncio loop preempt in the middle of an update, so there is no locking.
+"""
+import functools
+import math
+import time
+from bisect import bisect_left
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Seconds; spans a cached lookup up to a slow full recomputation or install
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Registry(object):
+    """Metrics rendered together by one /metrics endpoint."""
+
+    def __init__(self):
+        self.metrics = {}  # name -> metric, in registration order
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"metric {metric.name} already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, labels, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{_labels(labels)} {_number(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Metric(object):
+    kind = 'untyped'
+
+    def __init__(self, name, help, labels=(), registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}  # label values tuple -> value
+        self._fn = None
+        registry.register(self)
+
+    def set_function(self, fn):
+        """Read the value(s) from ``fn`` at scrape time instead.
+
+        ``fn`` returns a number, or {label values tuple: number} for
+        labelled metrics.
+        """
+        self._fn = fn
+
+    def samples(self):
+        values = self.values
+        if self._fn is not None:
+            values = self._fn()
+            if not isinstance(values, dict):
+                values = {(): values}
+        for key, value in values.items():
+            yield '', tuple(zip(self.labels, key)), value
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, *labels):
+        self.values[labels] = value
+
+
+class Histogram(Metric):
+    """Fixed-bucket histogram; buckets are made cumulative at scrape time."""
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS, registry=REGISTRY):
+        super(Histogram, self).__init__(name, help, labels, registry)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        series = self.values.get(labels)
+        if series is None:
+            # Per-bucket counts (the last one is +Inf), then the sum
+            series = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def samples(self):
+        for key, series in self.values.items():
+            pairs = tuple(zip(self.labels, key))
+            total = 0
+            for bound, count in zip(self.buckets + (math.inf,), series):
+                total += count
+                yield '_bucket', pairs + (('le', _number(float(bound))),), total
+            yield '_sum', pairs, series[-1]
+            yield '_count', pairs, total
+
+
+def timed(histogram, *labels):
+    """Decorator recording each call's duration into ``histogram``."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start, *labels)
+        return wrapper
+    return decorate
@@ -1,55 +1,300 @@
 """
-Mininet script to create a NSFNET-like topology.
+Mininet script to create a NSFNET-like topology, or larger synthetic ones.
 
 Run on Linux (recommended) with Mininet installed.
-Example:
-  sudo python3 mininet_nsfnnet.py
+Examples:
+  sudo python3 mininet_nsfnnet.py                               # NSFNET, h1..h14, controller 127.0.0.1
+  sudo python3 mininet_nsfnnet.py 10.0.0.5 --topo nsfnet,hosts=4
+  sudo python3 mininet_nsfnnet.py --topo fattree,k=8,hosts=4 --bw 1000 --delay 1ms
+  sudo python3 mininet_nsfnnet.py --topo torus,rows=16,cols=16 --loss 0.1
+  sudo python3 mininet_nsfnnet.py --topo file,path=geant.graphml
 
-Each switch will have one host attached (h1..h14). Links include bandwidth attributes (TCLink).
+The optional first argument is the controller IP (servidor.py passes the Ryu host).
+--topo uses Mininet's own syntax, name,arg,key=value:
+  nsfnet                  the 14-switch NSFNET with its example bandwidths
+  fattree,k=K             k-ary fat-tree; hosts attach to the k^2/2 edge switches
+  torus,rows=R,cols=C     2-D torus (wrap-around grid)
+  file,path=P             edge list ("a b bw=50 delay=2ms loss=1" per line, # comments) or .graphml
+Every spec takes hosts=N (hosts per host-carrying switch, default 1, 0 for none) and
+bw=, delay=, loss= link defaults. Per-link values from NSFNET or a file win over
+those, which win over --bw/--delay/--loss. bw is in Mbit/s, delay in ms unless it
+has a unit, loss in percent. Switches are s1..sN (dpid = N), hosts h1..hM.
+
+Links are created in bulk: all veth pairs with one `ip -batch` and all OVS
+bridges with one ovs-vsctl call, and only links with bw/delay/loss get
+traffic control, so large topologies come up in seconds rather than minutes.
 """
+import argparse
+import signal
+import subprocess
+import sys
+import threading
+import xml.etree.ElementTree as ET
+from functools import partial
+
 from mininet.topo import Topo
 from mininet.net import Mininet
 from mininet.node import RemoteController, OVSKernelSwitch
-from mininet.link import TCLink
+from mininet.link import Link, TCLink
 from mininet.cli import CLI
 from mininet.log import setLogLevel, info
+from mininet.util import makeNumeric, splitArgs
+
+# NSFNET-like links (undirected). Bandwidths are examples.
+NSFNET_EDGES = [
+    (1, 2, 50), (1, 3, 50), (2, 4, 50), (3, 4, 50), (2, 5, 30), (4, 6, 30),
+    (5, 6, 40), (5, 7, 20), (6, 8, 20), (7, 9, 30), (8, 9, 30), (8, 10, 40),
+    (9, 11, 25), (10, 11, 25), (10, 12, 50), (11, 13, 50), (12, 13, 60), (12, 14, 60), (13, 14, 70)
+]
+HOST_BW = 100
+LINK_PARAMS = ('bw', 'delay', 'loss')
+GRAPHML_NS = '{http://graphml.graphdrawing.org/xmlns}'
+
+
+def link_params(**params):
+    """Normalize bw/delay/loss for TCLink, dropping unset ones."""
+    result = {}
+    if params.get('bw'):
+        result['bw'] = float(params['bw'])
+    delay = makeNumeric(str(params['delay'])) if params.get('delay') is not None else None
+    if delay not in (None, '', 0):
+        # netem reads a bare number as microseconds; ours are milliseconds
+        result['delay'] = f'{delay}ms' if isinstance(delay, (int, float)) else str(delay)
+    if params.get('loss'):
+        result['loss'] = float(params['loss'])
+    return result
+
+
+class SpecTopo(Topo):
+    """Switches s<dpid> wired by (a, b, params) edges, with hosts on the given switches."""
+
+    def build(self, edges, host_switches=None, hosts_per_switch=1, link_opts=None, host_opts=None):
+        link_opts = link_opts or {}
+        dpids = sorted({n for a, b, _ in edges for n in (a, b)})
+        switches = {i: self.addSwitch(f's{i}') for i in dpids}
+
+        count = 0
+        for i in (dpids if host_switches is None else host_switches):
+            for _ in range(hosts_per_switch):
+                count += 1
+                self.addLink(self.addHost(f'h{count}'), switches[i], **(host_opts or {}))
+
+        for a, b, params in edges:
+            self.addLink(switches[a], switches[b], **dict(link_opts, **params))
+
+
+def nsfnet():
+    return [(a, b, {'bw': bw}) for a, b, bw in NSFNET_EDGES], None
+
+
+def fat_tree(k=4):
+    """k-ary fat-tree numbered core, aggregation, edge; hosts go on the edge switches."""
+    if k < 2 or k % 2:
+        raise ValueError(f'fattree needs an even k >= 2, got {k}')
+    half = k // 2
+    n_core = half * half
+
+    def agg(pod, i):
+        return n_core + pod * half + i + 1
+
+    def edge(pod, i):
+        return n_core + k * half + pod * half + i + 1
+
+    edges = []
+    for pod in range(k):
+        for i in range(half):
+            for j in range(half):
+                edges.append((edge(pod, i), agg(pod, j), {}))
+                edges.append((agg(pod, i), i * half + j + 1, {}))
+    return edges, [edge(pod, i) for pod in range(k) for i in range(half)]
+
+
+def torus(rows=4, cols=4):
+    """rows x cols grid with wrap-around links; switch (r, c) is r * cols + c + 1."""
+    seen = set()
+    edges = []
+    for r in range(rows):
+        for c in range(cols):
+            a = r * cols + c + 1
+            for b in (r * cols + (c + 1) % cols + 1, ((r + 1) % rows) * cols + c + 1):
+                # Rings of one or two switches would add self-loops or parallel links
+                if a != b and (min(a, b), max(a, b)) not in seen:
+                    seen.add((min(a, b), max(a, b)))
+                    edges.append((a, b, {}))
+    return edges, None
+
+
+def _graphml_edges(path):
+    root = ET.parse(path).getroot()
+    keys = {k.get('id'): k.get('attr.name') for k in root.iter(f'{GRAPHML_NS}key')}
+    nodes = [n.get('id') for n in root.iter(f'{GRAPHML_NS}node')]
+    edges = []
+    for e in root.iter(f'{GRAPHML_NS}edge'):
+        attrs = {keys.get(d.get('key'), d.get('key')): makeNumeric((d.text or '').strip())
+                 for d in e.iter(f'{GRAPHML_NS}data')}
+        # Topology Zoo files carry the link speed in bit/s
+        if 'bw' not in attrs and isinstance(attrs.get('LinkSpeedRaw'), (int, float)):
+            attrs['bw'] = attrs['LinkSpeedRaw'] / 1e6
+        edges.append((e.get('source'), e.get('target'), attrs))
+    return nodes, edges
+
+
+def _edge_list(path):
+    nodes, edges = [], []
+    with open(path) as f:
+        for lineno, line in enumerate(f, 1):
+            fields = line.split('#', 1)[0].split()
+            if not fields:
+                continue
+            if len(fields) < 2 or any('=' not in field for field in fields[2:]):
+                raise ValueError(f'{path}:{lineno}: expected "a b [key=value ...]"')
+            attrs = dict(field.split('=', 1) for field in fields[2:])
+            edges.append((fields[0], fields[1], {k: makeNumeric(v) for k, v in attrs.items()}))
+            nodes.extend(fields[:2])
+    return nodes, edges
+
+
+def from_file(path):
+    """Edge list or GraphML file; nodes are renumbered 1..N in (numeric) id order."""
+    path = str(path)
+    nodes, raw = (_graphml_edges if path.endswith('.graphml') else _edge_list)(path)
+    names = sorted(set(nodes), key=lambda n: (0, int(n), '') if n.isdigit() else (1, 0, n))
+    dpid = {name: i for i, name in enumerate(names, 1)}
+    seen = set()
+    edges = []
+    for a, b, attrs in raw:
+        a, b = dpid[a], dpid[b]
+        # Parallel links and self-loops add nothing but discovery noise
+        if a == b or (min(a, b), max(a, b)) in seen:
+            continue
+        seen.add((min(a, b), max(a, b)))
+        edges.append((a, b, link_params(**{k: attrs.get(k) for k in LINK_PARAMS})))
+    return edges, None
+
+
+TOPOLOGIES = {'nsfnet': nsfnet, 'fattree': fat_tree, 'torus': torus, 'file': from_file}
+
+
+def build_topo(spec, link_opts=None, host_opts=None):
+    """SpecTopo for a --topo string such as 'fattree,k=8,hosts=2,bw=1000'."""
+    name, args, kwargs = splitArgs(spec)
+    if name not in TOPOLOGIES:
+        raise ValueError(f"unknown topology '{name}', expected one of {', '.join(TOPOLOGIES)}")
+    hosts = kwargs.pop('hosts', 1)
+    spec_opts = link_params(**{k: kwargs.pop(k) for k in LINK_PARAMS if k in kwargs})
+    edges, host_switches = TOPOLOGIES[name](*args, **kwargs)
+    return SpecTopo(edges, host_switches, hosts, dict(link_opts or {}, **spec_opts), host_opts)
+
+
+class PrebuiltIntfPair(object):
+    """Link mixin for veth pairs that BatchedMininet already created."""
+
+    @classmethod
+    def makeIntfPair(cls, *args, **kwargs):
+        return ''
+
+
+class PrebuiltLink(PrebuiltIntfPair, Link):
+    pass
+
+
+class PrebuiltTCLink(PrebuiltIntfPair, TCLink):
+    pass
+
+
+def create_veth_pairs(pairs):
+    """Create [(node1, intf1, node2, intf2)] veth pairs with a single `ip -batch`."""
+    script = ''.join(f'link add name {i1} netns {n1.pid} type veth peer name {i2} netns {n2.pid}\n'
+                     for n1, i1, n2, i2 in pairs)
+    result = subprocess.run(['ip', '-batch', '-'], input=script, capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(f'ip -batch failed: {result.stderr.strip()}')
+
+
+class BatchedMininet(Mininet):
+    """Mininet that creates a topology's links in bulk.
+
+    Mininet runs one `ip link add` per link through the node's shell;
+    here buildFromTopo only queues the links, creates every veth pair in
+    one iproute2 batch and then builds the Link objects over them. Links
+    without bw/delay/loss skip traffic control setup altogether.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._pending = None
+        super().__init__(*args, **kwargs)
+
+    def buildFromTopo(self, topo=None):
+        self._pending = []
+        try:
+            super().buildFromTopo(topo)
+            pending = self._pending
+        finally:
+            self._pending = None
+        if not pending:
+            return
+        info(f'*** Creating {len(pending)} veth pairs\n')
+        create_veth_pairs([(n1, n1.intfName(p1), n2, n2.intfName(p2)) for n1, n2, p1, p2, _ in pending])
+        for node1, node2, port1, port2, params in pending:
+            shaped = any(params.get(k) is not None for k in LINK_PARAMS)
+            super().addLink(node1, node2, port1, port2, cls=PrebuiltTCLink if shaped else PrebuiltLink,
+                            **params)
+
+    def addLink(self, node1, node2, port1=None, port2=None, cls=None, **params):
+        if self._pending is None or cls is not None or port1 is None or port2 is None:
+            return super().addLink(node1, node2, port1, port2, cls, **params)
+        node1 = self[node1] if isinstance(node1, str) else node1
+        node2 = self[node2] if isinstance(node2, str) else node2
+        self._pending.append((node1, node2, port1, port2, params))
+        return None
+
+
+def wait_for_signal():
+    """Block until SIGINT/SIGTERM.
+
+    servidor.py records the PID of the launched script and sends it SIGTERM
+    on stop, then waits for net.stop() to finish before running `mn -c`.
+    """
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+    while not stop.wait(1.0):
+        pass
+
 
+def run(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('controller', nargs='?', default='127.0.0.1', help='controller IP (default 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=6633, help='controller OpenFlow port')
+    parser.add_argument('--topo', default='nsfnet', help='topology spec (default nsfnet)')
+    parser.add_argument('--bw', type=float, help='switch link bandwidth, Mbit/s')
+    parser.add_argument('--delay', help='switch link delay, e.g. 2ms')
+    parser.add_argument('--loss', type=float, help='switch link loss, percent')
+    parser.add_argument('--host-bw', type=float, default=HOST_BW,
+                        help=f'host link bandwidth, Mbit/s (default {HOST_BW}, 0 for unshaped)')
+    parser.add_argument('--no-cli', action='store_true',
+                        help='run until SIGTERM instead of opening the CLI (implied without a terminal)')
+    args = parser.parse_args(argv)
 
-class NSFNetTopo(Topo):
-    def build(self):
-        # NSFNET core nodes (14) - simplified
-        switches = {}
-        for i in range(1, 15):
-            sid = f's{i}'
-            switches[i] = self.addSwitch(sid)
-
-        # Attach one host per switch
-        for i in range(1, 15):
-            hid = f'h{i}'
-            h = self.addHost(hid)
-            self.addLink(h, switches[i], bw=100)
-
-        # Define NSFNET-like links (undirected). Bandwidths are examples.
-        edges = [
-            (1,2,50),(1,3,50),(2,4,50),(3,4,50),(2,5,30),(4,6,30),
-            (5,6,40),(5,7,20),(6,8,20),(7,9,30),(8,9,30),(8,10,40),
-            (9,11,25),(10,11,25),(10,12,50),(11,13,50),(12,13,60),(12,14,60),(13,14,70)
-        ]
-
-        for a, b, bw in edges:
-            self.addLink(switches[a], switches[b], bw=bw)
-
-
-def run():
-    topo = NSFNetTopo()
-    # Use a remote controller (Ryu) on localhost:6653 (or change as needed)
-    net = Mininet(topo=topo, link=TCLink, controller=None, switch=OVSKernelSwitch, autoSetMacs=True)
-    c = RemoteController('c0', ip='127.0.0.1', port=6633)
+    topo = build_topo(args.topo, link_params(bw=args.bw, delay=args.delay, loss=args.loss),
+                      link_params(bw=args.host_bw))
+    info(f'*** Topology {args.topo}: {len(topo.switches())} switches, {len(topo.hosts())} hosts, '
+         f'{len(topo.links())} links\n')
+    # batch=True: one ovs-vsctl call configures every bridge at start
+    switch = partial(OVSKernelSwitch, batch=True)
+    net = BatchedMininet(topo=topo, link=TCLink, controller=None, switch=switch, autoSetMacs=True)
+    c = RemoteController('c0', ip=args.controller, port=args.port)
     net.addController(c)
     net.start()
-    info('*** Network started')
-    CLI(net)
-    net.stop()
+    info('*** Network started\n')
+    try:
+        # Started through nohup/ssh there is no terminal; the CLI would exit on EOF
+        if args.no_cli or sys.stdin is None or not sys.stdin.isatty():
+            wait_for_signal()
+        else:
+            CLI(net)
+    finally:
+        net.stop()
 
 
 if __name__ == '__main__':
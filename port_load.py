@@ -0,0 +1,84 @@
+"""
+Per-port load tracking for the load-aware routing mode.
+
+Every switch port gets a dense slot on first sight and its counters live in
+flat typed arrays (last tx byte count, timestamp, EWMA utilization, load
+level), so a port-stats sample is a handful of in-place array writes and
+memory grows by a few dozen bytes per port.
+
+Utilization is quantized into levels with hysteresis: a port climbs a level
+as soon as its EWMA crosses a threshold but only drops back once it is
+``hysteresis`` below it, so routes don't flap around a threshold.
+"""
+from array import array
+from bisect import bisect_right
+
+
+class PortLoadTable(object):
+    """Array-backed tx counters, EWMA utilization and load level per port."""
+
+    def __init__(self, alpha=0.3, thresholds=(0.5, 0.75, 0.9), hysteresis=0.1):
+        self.alpha = alpha
+        self.thresholds = tuple(thresholds)
+        self.hysteresis = hysteresis
+        self.slots = {}  # (dpid, port_no) -> slot
+        self.tx_bytes = array('Q')
+        self.stamp = array('d')  # seconds, -1 until the first sample
+        self.ewma = array('d')
+        self.level = array('b')
+
+    def __len__(self):
+        return len(self.slots)
+
+    @property
+    def nbytes(self):
+        return sum(a.itemsize * len(a) for a in (self.tx_bytes, self.stamp, self.ewma, self.level))
+
+    def _slot(self, dpid, port_no):
+        slot = self.slots.get((dpid, port_no))
+        if slot is None:
+            slot = self.slots[(dpid, port_no)] = len(self.tx_bytes)
+            self.tx_bytes.append(0)
+            self.stamp.append(-1.0)
+            self.ewma.append(0.0)
+            self.level.append(0)
+        return slot
+
+    def sample(self, dpid, port_no, tx_bytes, stamp, capacity):
+        """Fold one counter reading in; returns True when the port's level changed.
+
+        ``stamp`` is in seconds (any monotonic per-port clock) and
+        ``capacity`` in bytes per second.
+        """
+        i = self._slot(dpid, port_no)
+        last_bytes, last_stamp = self.tx_bytes[i], self.stamp[i]
+        self.tx_bytes[i] = tx_bytes
+        self.stamp[i] = stamp
+        elapsed = stamp - last_stamp
+        # First reading, counter reset or port re-created: nothing to compare against
+        if last_stamp < 0 or elapsed <= 0 or tx_bytes < last_bytes or capacity <= 0:
+            return False
+        util = min((tx_bytes - last_bytes) / elapsed / capacity, 1.0)
+        ewma = self.ewma[i] = self.alpha * util + (1.0 - self.alpha) * self.ewma[i]
+        level = self.level[i]
+        new = bisect_right(self.thresholds, ewma)
+        if new < level:
+            new = max(new, bisect_right(self.thresholds, ewma + self.hysteresis))
+        if new == level:
+            return False
+        self.level[i] = new
+        return True
+
+    def level_of(self, dpid, port_no):
+        slot = self.slots.get((dpid, port_no))
+        return 0 if slot is None else self.level[slot]
+
+    def utilization(self, dpid, port_no):
+        slot = self.slots.get((dpid, port_no))
+        return 0.0 if slot is None else self.ewma[slot]
+
+    def factor(self, level):
+        """Weight multiplier for a level: 1 / the spare capacity at its threshold."""
+        if level <= 0:
+            return 1.0
+        return 1.0 / max(1.0 - self.thresholds[level - 1], 0.05)
@@ -0,0 +1,255 @@
+"""
+Shortest-path engines used by the Ryu routing app.
+
+The tree engine runs one single-source search per source switch and reads
+every destination off the predecessor tree, so hosts attached to the same
+switch share one tree. The pairwise engine is the original per host-pair
+Dijkstra and is kept as a reference for benchmarks.
+"""
+from heapq import heappop, heappush
+
+import networkx as nx
+
+MODES = ('dijkstra_bw', 'shortest_hops', 'dijkstra_load', 'ecmp')
+# Edge attribute each weighted mode runs Dijkstra on
+WEIGHT_KEYS = {'dijkstra_bw': 'weight', 'dijkstra_load': 'load_weight', 'ecmp': 'weight'}
+# Relative tolerance for comparing distances: sums of 1/bw weights taken
+# along different paths can differ in the last bits even when equal
+DIST_RTOL = 1e-9
+
+
+def uses_weights(mode):
+    """Hop-count trees depend on topology only, never on edge weights."""
+    return mode != 'shortest_hops'
+
+
+def weight_key(mode):
+    """Edge attribute holding the weight for ``mode``, or None for hop count."""
+    return WEIGHT_KEYS.get(mode) if uses_weights(mode) else None
+
+
+def dist_slack(value):
+    """Absolute rounding slack for a distance comparison around ``value``."""
+    return DIST_RTOL * max(1.0, abs(value))
+
+
+class ShortestPathTree(object):
+    """Predecessor tree rooted at one switch for a given routing mode."""
+
+    def __init__(self, source, pred, dist, mode='dijkstra_bw'):
+        self.source = source
+        self.mode = mode
+        self.pred = pred  # node -> [predecessors on a shortest path]
+        self.dist = dist  # node -> distance from source
+        self._paths = {source: [source]}
+
+    @classmethod
+    def build(cls, graph, source, mode):
+        if not uses_weights(mode):
+            # Unweighted BFS: no per-edge weight lookups at all
+            pred, dist = nx.predecessor(graph, source, return_seen=True)
+        else:
+            pred, dist = dijkstra_predecessors(graph, source, weight_key(mode))
+        return cls(source, pred, dist, mode)
+
+    def path_to(self, target):
+        """Return the node list source..target, or None if unreachable."""
+        path = self._paths.get(target)
+        if path is not None or target not in self.pred:
+            return path
+        # Walk up to the nearest memoized ancestor, then extend its path
+        rev = [target]
+        node = self.parent(target)
+        while node not in self._paths:
+            rev.append(node)
+            node = self.parent(node)
+        path = self._paths[node] + rev[::-1]
+        self._paths[target] = path
+        return path
+
+    def parent(self, node):
+        # Canonical tie-break: lowest dpid among equal-cost switch predecessors.
+        # Zero-weight host edges can add host nodes as tied predecessors.
+        preds = self.pred[node]
+        if len(preds) == 1:
+            return preds[0]
+        switches = [p for p in preds if not is_host_node(p)]
+        return min(switches) if switches else preds[0]
+
+    def distance(self, node):
+        return self.dist.get(node)
+
+    def backup_next_hop(self, graph, node, primary, node_tree=None):
+        return backup_next_hop(graph, self, node, primary, node_tree)
+
+    def uses_edge(self, u, v):
+        return u in self.pred.get(v, ())
+
+    def uses_node(self, node):
+        return any(node in preds for preds in self.pred.values())
+
+    def affected_by_new_edge(self, u, v, attrs):
+        # A new (or cheaper) edge u->v changes the tree only if it improves or ties dist[v]
+        if u not in self.dist:
+            return False
+        key = weight_key(self.mode)
+        weight = attrs.get(key, 1.0) if key else 1
+        return v not in self.dist or self.dist[u] + weight <= self.dist[v] + dist_slack(self.dist[v])
+
+
+def dijkstra_predecessors(graph, source, key):
+    """Like nx.dijkstra_predecessor_and_distance, with ties detected up to dist_slack.
+
+    NetworkX compares path lengths exactly, so two equal-cost 1/bw paths
+    whose sums round differently would not both be predecessors. The CSR
+    backend uses the same slack.
+    """
+    adj = graph._adj
+    rtol = DIST_RTOL
+    dist = {}
+    pred = {source: []}
+    seen = {source: 0}
+    heap = [(0, 0, source)]
+    count = 1
+    while heap:
+        d, _, v = heappop(heap)
+        if v in dist:
+            continue
+        dist[v] = d
+        for u, data in adj[v].items():
+            vu = d + data.get(key, 1.0)
+            old = seen.get(u)
+            if old is None:
+                seen[u] = vu
+                heappush(heap, (vu, count, u))
+                count += 1
+                pred[u] = [v]
+                continue
+            # dist_slack(old), inlined: this loop is the hot path
+            slack = rtol * old if old > 1.0 else rtol
+            if vu < old - slack:
+                if u not in dist:
+                    seen[u] = vu
+                    heappush(heap, (vu, count, u))
+                    count += 1
+                    pred[u] = [v]
+            elif vu - old <= slack:
+                pred[u].append(v)
+    return pred, dist
+
+
+def backup_next_hop(graph, tree, node, primary, node_tree=None):
+    """Loop-free alternate next hop from ``node`` towards the root of ``tree``.
+
+    Links are symmetric, so a tree rooted at the destination switch also
+    gives every node's distance to it: the tree yields the primary next hop
+    (its parent) and this function the backup. A neighbour qualifies when no
+    shortest path from it to the destination comes back through ``node``:
+    dist(nbr, dst) < dist(nbr, node) + dist(node, dst), with dist(nbr, node)
+    read from ``node_tree`` (the tree rooted at ``node``). Without that tree
+    only neighbours strictly closer to the destination qualify. Both tests
+    leave dist_slack of room, since a tie that only rounds to "less" may
+    still route back through ``node``. Either way the detour is loop-free
+    for a single link failure, and the backup link differs from the primary
+    one. Returns None when no neighbour qualifies.
+    """
+    here = tree.distance(node)
+    if here is None:
+        return None
+    key = weight_key(tree.mode)
+    best = None
+    for nbr, data in graph[node].items():
+        if nbr == primary or is_host_node(nbr):
+            continue
+        there = tree.distance(nbr)
+        if there is None:
+            continue
+        back = node_tree.distance(nbr) if node_tree is not None else None
+        bound = here if back is None else back + here
+        if there >= bound - dist_slack(bound):
+            continue
+        cost = there + (data.get(key, 1.0) if key else 1)
+        if best is None or (cost, nbr) < best:
+            best = (cost, nbr)
+    return best[1] if best else None
+
+
+def equal_cost_next_hops(graph, tree, node):
+    """Neighbours of ``node`` on some shortest path towards the root of ``tree``.
+
+    As for backup_next_hop, links are symmetric, so the tree rooted at the
+    destination switch gives every node's distance to it. A neighbour is an
+    equal-cost next hop when it is one link closer, up to dist_slack, so
+    equal-cost paths whose 1/bw sums round differently are all kept.
+    """
+    here = tree.distance(node)
+    if here is None:
+        return []
+    key = weight_key(tree.mode)
+    hops = []
+    for nbr, data in graph[node].items():
+        if is_host_node(nbr):
+            continue
+        there = tree.distance(nbr)
+        if there is not None and abs(there + (data.get(key, 1.0) if key else 1) - here) <= dist_slack(here):
+            hops.append(nbr)
+    return sorted(hops)
+
+
+def is_host_node(node):
+    return isinstance(node, str) and node.startswith('host-')
+
+
+def host_attachments(graph):
+    """Return [(host node, attachment switch)] for hosts wired into the graph."""
+    result = []
+    for node, data in graph.nodes(data=True):
+        if data.get('type') != 'host':
+            continue
+        for sw in graph.successors(node):
+            result.append((node, sw))
+            break
+    return result
+
+
+def tree_routes(graph, mode, trees=None):
+    """All host-pair routes from one tree per source switch.
+
+    ``trees`` is an optional {switch: ShortestPathTree} cache; missing trees
+    are built and stored into it.
+    """
+    if trees is None:
+        trees = {}
+    routes = {}
+    hosts = host_attachments(graph)
+    for i in range(len(hosts)):
+        src, src_sw = hosts[i]
+        tree = trees.get(src_sw)
+        if tree is None:
+            tree = trees[src_sw] = ShortestPathTree.build(graph, src_sw, mode)
+        for j in range(i + 1, len(hosts)):
+            dst, dst_sw = hosts[j]
+            sw_path = tree.path_to(dst_sw)
+            if sw_path is not None:
+                routes[(src, dst)] = [src] + sw_path + [dst]
+    return routes
+
+
+def pairwise_routes(graph, mode):
+    """Reference engine: one nx.shortest_path call per host pair."""
+    routes = {}
+    host_nodes = [n for n, d in graph.nodes(data=True) if d.get('type') == 'host']
+    for i in range(len(host_nodes)):
+        for j in range(i + 1, len(host_nodes)):
+            src = host_nodes[i]
+            dst = host_nodes[j]
+            try:
+                if uses_weights(mode):
+                    path = nx.shortest_path(graph, src, dst, weight=weight_key(mode))
+                else:
+                    # Hop count: unweighted BFS, no per-edge callback
+                    path = nx.shortest_path(graph, src, dst)
+                routes[(src, dst)] = path
+            except nx.NetworkXNoPath:
+                pass
+    return routes
@@ -3,12 +3,213 @@ from ryu.controller import ofp_event
 from ryu.controller.handler import CONFIG_DISPATCHER, MAIN_DISPATCHER, set_ev_cls
 from ryu.ofproto import ofproto_v1_3
 from ryu.topology import event, switches
-from ryu.app.wsgi import ControllerBase, WSGIApplication
+from ryu.app.wsgi import ControllerBase, Response, WSGIApplication, route
 from ryu.topology.api import get_all_link, get_all_switch, get_all_host
+from ryu.lib import hub
+from ryu.lib.packet import arp, ether_types, ethernet, ipv4
 import networkx as nx
+import collections
+import ipaddress
+import itertools
 import json
+import logging
+import os
+import struct
+import time
+
+from metrics import CONTENT_TYPE, REGISTRY, Counter, Gauge, Histogram, timed
+from port_load import PortLoadTable
+from routing_engine import (MODES, ShortestPathTree, equal_cost_next_hops, host_attachments, is_host_node,
+                            tree_routes, weight_key)
+
+try:
+    from topology_csr import CSRTopology, csr_trees
+except ImportError:  # numpy/scipy not installed
+    CSRTopology = None
+
+try:
+    import orjson
+except ImportError:  # compact stdlib json instead
+    orjson = None
 
 DEFAULT_BW = 100.0
+# 'networkx' (incremental per-switch trees) or 'csr' (batched scipy all-pairs)
+ROUTING_BACKEND = os.environ.get('ROUTING_BACKEND', 'networkx')
+# Seconds the REST API waits for barrier replies after a flow install
+INSTALL_TIMEOUT = 10.0
+# Marks the flows this app owns so they can be wiped without touching other apps
+FLOW_COOKIE = 0x524f55
+FLOW_PRIORITY = 100
+# 'mac' (one eth_dst rule per switch and destination) or 'ipv4' (also collapse
+# destinations behind the same port into IPv4 prefixes)
+FLOW_AGGREGATION = os.environ.get('FLOW_AGGREGATION', 'mac')
+# Seconds to coalesce a burst of topology events into one reroute
+REROUTE_DEBOUNCE = 0.1
+# Protect each rule with an OFPGT_FF group holding a precomputed backup port
+FAST_FAILOVER = os.environ.get('FAST_FAILOVER', '1') != '0'
+# Flow actions that point at a group instead of a port
+GROUP_ACTIONS = ('ff', 'select')
+# Group ids this app allocates start here, clear of the low ids other apps pick
+GROUP_ID_BASE = FLOW_COOKIE << 8
+# Seconds between port-stats polls while the 'dijkstra_load' mode is selected
+LOAD_POLL_INTERVAL = float(os.environ.get('LOAD_POLL_INTERVAL', '5'))
+# EWMA utilization thresholds for the load levels, and how far below a
+# threshold a port must fall before it drops back a level
+LOAD_THRESHOLDS = (0.5, 0.75, 0.9)
+LOAD_HYSTERESIS = 0.1
+LOAD_EWMA_ALPHA = 0.3
+# Change events kept for /routing/events consumers that fall behind
+EVENT_LOG_SIZE = 256
+# Longest a /routing/events long-poll blocks before answering with no changes
+EVENT_POLL_TIMEOUT = 30.0
+# Route sets kept for /routing/status?since=<generation> deltas (each is H^2 paths)
+ROUTE_HISTORY_SIZE = 4
+# Answer table misses: learn where the sender sits and install the path to the
+# destination on demand, including hosts the topology app has not reported yet
+REACTIVE = os.environ.get('REACTIVE', '1') != '0'
+# Reactive rules are a per-destination cache: below the proactive rules, own
+# cookie so they can be flushed alone, expired by the switch once idle
+REACTIVE_COOKIE = FLOW_COOKIE | (1 << 32)
+REACTIVE_PRIORITY = FLOW_PRIORITY - 10
+REACTIVE_IDLE_TIMEOUT = 30
+# Bytes of a missed packet sent up; switches that buffer keep the rest behind a buffer_id
+MISS_SEND_LEN = 128
+# Packet-ins handled per switch: sustained rate per second and burst (token bucket)
+PACKET_IN_RATE = float(os.environ.get('PACKET_IN_RATE', '100'))
+PACKET_IN_BURST = 200
+# Seconds an identical flooded packet is ignored; stops copies looping back
+# through ports LLDP has not identified as switch links yet
+FLOOD_DEDUP_WINDOW = 0.5
+
+# Exposed on /metrics
+COMPUTE_SECONDS = Histogram('routing_compute_paths_seconds',
+                            'Route computation time when the route cache is stale', ('mode', 'backend'))
+COMPUTE_CACHE_HITS = Counter('routing_compute_paths_cache_hits_total',
+                             'compute_paths calls answered from the route cache')
+OPENFLOW_COMMANDS = Counter('routing_openflow_commands_total',
+                            'Flow and group commands sent, per datapath', ('dpid', 'command'))
+HANDLER_SECONDS = Histogram('routing_event_handler_seconds', 'Time spent in each Ryu event handler', ('event',))
+EVENT_QUEUE_DEPTH = Gauge('routing_event_queue_depth', "Events waiting in the app's Ryu event queue")
+CONVERGENCE_SECONDS = Histogram('routing_convergence_seconds',
+                                'First topology event of a burst to the last barrier reply of its reroute')
+GENERATION = Gauge('routing_generation', 'Topology/mode generation')
+PACKET_INS = Counter('routing_packet_in_total', 'Table-miss packet-ins by switch and outcome', ('dpid', 'outcome'))
+
+
+def dumps(obj):
+    """Compact JSON text, through orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode('utf-8')
+    return json.dumps(obj, separators=(',', ':'))
+
+
+def route_delta(base, routes):
+    """(new or changed routes, removed keys) that turn ``base`` into ``routes``."""
+    changed = {key: path for key, path in routes.items() if base.get(key) != path}
+    return changed, [key for key in base if key not in routes]
+
+
+def orient_route(path, src, dst):
+    """``path`` or its reverse, whichever runs from ``src`` to ``dst``; None if neither.
+
+    ``src`` and ``dst`` are (host node, dpid) filters on the route's end
+    host and its switch, with None meaning any. Routes are stored once per
+    host pair and links are symmetric, so the reverse is a valid route too.
+    """
+    def matches(host, dpid, want):
+        return (want[0] is None or host == want[0]) and (want[1] is None or dpid == want[1])
+
+    if matches(path[0], path[1], src) and matches(path[-1], path[-2], dst):
+        return path
+    if matches(path[-1], path[-2], src) and matches(path[0], path[1], dst):
+        return path[::-1]
+    return None
+
+
+def host_node(value):
+    """Graph node for a host given as a MAC or as its 'host-<mac>' node."""
+    return value if value.startswith('host-') else f"host-{value.lower()}"
+
+
+def is_multicast_mac(mac):
+    # Group bit of the first octet; covers broadcast too
+    return bool(int(mac[:2], 16) & 1)
+
+
+def json_response(body, status=200):
+    """Response for a controller action from JSON text."""
+    return Response(status=status, content_type='application/json', text=body)
+
+
+class StaleCursor(Exception):
+    """A /routing/status cursor issued for an older generation."""
+
+
+def aggregate_ipv4(dsts):
+    """Collapse {ip: action} into [(network, action)] with disjoint prefixes."""
+    by_action = {}
+    for ip, action in dsts.items():
+        by_action.setdefault(action, []).append(ipaddress.ip_network(ip))
+    result = []
+    for action, nets in by_action.items():
+        for net in ipaddress.collapse_addresses(nets):
+            result.append((net, action))
+    return result
+
+
+class FlowInstall(object):
+    """One batched flow install, complete once every datapath answers its barrier."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.flow_mods = {}  # dpid -> Flow/GroupMods sent, not counting barriers or packet-outs
+        self.commands = {'add': 0, 'modify': 0, 'delete': 0, 'group_add': 0, 'group_delete': 0}
+        self.rules = None  # flow compiler stats
+        self.pending = {}  # dpid -> barrier xid
+        self.latency = {}  # dpid -> seconds from send to barrier reply
+        self.finished = None
+        self.sealed = False  # set once every batch has been queued
+        self.done = hub.Event()
+
+    def barrier_sent(self, dpid, xid, count):
+        self.flow_mods[dpid] = count
+        self.pending[dpid] = xid
+
+    def barrier_replied(self, dpid):
+        self.pending.pop(dpid, None)
+        self.latency[dpid] = time.time() - self.started
+        self._check_done()
+
+    def abandon(self, dpid):
+        # Datapath left before replying; don't wait for it forever
+        self.pending.pop(dpid, None)
+        self._check_done()
+
+    def seal(self):
+        self.sealed = True
+        self._check_done()
+
+    def _check_done(self):
+        if self.sealed and not self.pending and not self.done.is_set():
+            self.finished = time.time()
+            self.done.set()
+
+    def wait(self, timeout=INSTALL_TIMEOUT):
+        self.done.wait(timeout=timeout)
+        return self.done.is_set()
+
+    def report(self):
+        end = self.finished if self.finished is not None else time.time()
+        return {
+            'complete': not self.pending,
+            'switches': len(self.flow_mods),
+            'flow_mods': sum(self.flow_mods.values()),
+            'commands': dict(self.commands),
+            'rules': self.rules,
+            'elapsed_ms': round((end - self.started) * 1000.0, 3),
+            'latency_ms': {str(dpid): round(t * 1000.0, 3) for dpid, t in self.latency.items()},
+            'pending': sorted(self.pending),
+        }
 
 
 class RoutingApp(app_manager.RyuApp):
@@ -19,99 +220,1013 @@ class RoutingApp(app_manager.RyuApp):
         super(RoutingApp, self).__init__(*args, **kwargs)
         self.net = nx.DiGraph()
         self.hosts = {}  # mac -> {dpid, port, ip}
+        self.host_ips = {}  # ip -> mac, for /routing/path lookups
         self.switches = set()
-        self.mode = "dijkstra_bw"  # or 'shortest_hops'
+        self.datapaths = {}  # dpid -> Datapath
+        self.ports = {}  # (dpid, neighbor switch or host node) -> out_port
+        self.port_neighbors = {}  # (dpid, port_no) -> neighbor, reverse of self.ports
+        self._installs = {}  # (dpid, barrier xid) -> FlowInstall
+        # Shadow of what this app has installed: dpid -> {(priority, match): action}
+        self.flow_tables = {}
+        # Groups: dpid -> {action: group_id}, for ('ff', primary port, backup port)
+        # and ('select', ((port, weight), ...)) actions
+        self.group_tables = {}
+        self._next_group_id = {}
+        # dpid -> group ids this app added and has not deleted; kept across
+        # reconnects so _delete_own_flows removes exactly these
+        self._owned_groups = {}
+        self.fast_failover = FAST_FAILOVER
+        self.flow_aggregation = FLOW_AGGREGATION
+        self.flow_stats = {'route_rules': 0, 'rules': 0, 'saved': 0}
+        self.mode = "dijkstra_bw"  # or 'shortest_hops', 'dijkstra_load', 'ecmp'
+        # Versioned route cache: mode -> source switch -> ShortestPathTree.
+        # A missing tree means it is dirty and must be recomputed.
+        self.generation = 0
+        self._trees = {}
+        self._routes_snapshot = None  # (generation, mode, routes)
+        # Recent route sets by generation, and the last delta served from them
+        self._route_history = collections.OrderedDict()
+        self._delta_cache = None  # (since, generation, changed, removed)
+        self._host_order = None  # (generation, {host node: position}); routes run from the earlier host
+        self.backend = ROUTING_BACKEND
+        if self.backend == 'csr' and CSRTopology is None:
+            self.logger.warning("CSR backend needs numpy and scipy; falling back to networkx")
+            self.backend = 'networkx'
+        self._csr_cache = None  # (generation, mode, {dpid: MatrixTree})
+        # Change feed for /routing/events. Every generation bump logs what
+        # changed and swaps in a fresh hub.Event, waking all long-polls at once.
+        self.changes = collections.deque(maxlen=EVENT_LOG_SIZE)
+        self._changed = hub.Event()
+        self._published = None  # (generation, {"src->dst": path}) last sent out
+        # Port-stats monitor for 'dijkstra_load'; runs only while that mode is selected
+        self.port_load = PortLoadTable(LOAD_EWMA_ALPHA, LOAD_THRESHOLDS, LOAD_HYSTERESIS)
+        self._monitor = None
+        # Automatic rerouting starts once flows have been installed proactively
+        self.proactive = False
+        self._reroute_started = None  # time of the first event in the pending burst
+        self._reroute_events = 0
+        self.convergence = {'reroutes': 0, 'last_ms': None, 'max_ms': None, 'last_events': 0,
+                            'last_flow_mods': 0, 'incomplete': 0}
+        # Reactive path setup for table misses
+        self.reactive = REACTIVE
+        self.switch_ports = {}  # dpid -> physical port numbers, for edge-port floods
+        self._reactive_pending = {}  # dst mac -> (FlowInstall, {dpid: out_port}) of the last path sent
+        self._reactive_dpids = set()  # switches that may hold reactive rules
+        self._packet_in_budget = {}  # dpid -> (tokens, time), per-switch token bucket
+        self._recent_floods = collections.OrderedDict()  # (src, dst, data hash) -> time flooded
+
+        EVENT_QUEUE_DEPTH.set_function(self.events.qsize)
+        GENERATION.set_function(lambda: self.generation)
 
         wsgi = kwargs['wsgi']
-        mapper = wsgi.mapper
         wsgi.register(RoutingController, {'app': self})
 
     @set_ev_cls(event.EventSwitchEnter)
+    @timed(HANDLER_SECONDS, 'switch_enter')
     def switch_enter_handler(self, ev):
         sw = ev.switch
         dpid = sw.dp.id
         self.logger.info(f"Switch enter: {dpid}")
         self.switches.add(dpid)
+        self.datapaths[dpid] = sw.dp
+        # The shadow can't be trusted across a reconnect: wipe our flows and start empty
+        self.flow_tables[dpid] = {}
+        self.group_tables[dpid] = {}
+        self._delete_own_flows(sw.dp)
+        self.switch_ports[dpid] = {port.port_no for port in sw.ports if not port.is_reserved()}
+        if self.reactive:
+            self._install_table_miss(sw.dp)
         self.net.add_node(dpid, type='switch')
+        # Re-attach hosts that were known on this switch before it left
+        for mac, info in self.hosts.items():
+            if info['dpid'] == dpid:
+                self._attach_host(mac)
+        self._topology_changed({'type': 'switch_enter', 'dpid': dpid})
+
+    @set_ev_cls(event.EventSwitchLeave)
+    @timed(HANDLER_SECONDS, 'switch_leave')
+    def switch_leave_handler(self, ev):
+        dpid = ev.switch.dp.id
+        self.logger.info(f"Switch leave: {dpid}")
+        self.switches.discard(dpid)
+        self.datapaths.pop(dpid, None)
+        self.flow_tables.pop(dpid, None)
+        self.group_tables.pop(dpid, None)
+        self.switch_ports.pop(dpid, None)
+        self._packet_in_budget.pop(dpid, None)
+        self._reactive_dpids.discard(dpid)
+        for key in [key for key in self._installs if key[0] == dpid]:
+            self._installs.pop(key).abandon(dpid)
+        if self.net.has_node(dpid):
+            self._invalidate_node(dpid)
+            for nbr in self.net.successors(dpid):
+                self._drop_port(dpid, nbr)
+                self._drop_port(nbr, dpid)
+            self.net.remove_node(dpid)
+        self._topology_changed({'type': 'switch_leave', 'dpid': dpid})
 
     @set_ev_cls(event.EventLinkAdd)
+    @timed(HANDLER_SECONDS, 'link_add')
     def link_add_handler(self, ev):
-        for link in ev.link:
+        # EventLinkAdd carries a single Link; accept a list as well
+        links = ev.link if isinstance(ev.link, (list, tuple)) else [ev.link]
+        changes = []
+        for link in links:
             src = link.src.dpid
             dst = link.dst.dpid
             bw = getattr(link, 'bw', DEFAULT_BW)
             if bw is None:
                 bw = DEFAULT_BW
             weight = 1.0 / float(bw) if float(bw) > 0 else 1.0
-            self.net.add_edge(src, dst, weight=weight, bw=bw)
-            self.net.add_edge(dst, src, weight=weight, bw=bw)
+            self._forget_hosts_on(src, link.src.port_no)
+            self._forget_hosts_on(dst, link.dst.port_no)
+            self._set_edge(src, dst, weight, bw)
+            self._set_edge(dst, src, weight, bw)
+            self._set_port(src, dst, link.src.port_no)
+            self._set_port(dst, src, link.dst.port_no)
             self.logger.info(f"Link added: {src} <-> {dst} bw={bw}")
+            changes.append({'type': 'link_add', 'src': src, 'dst': dst, 'bw': bw})
+        self._topology_changed(*changes)
+
+    @set_ev_cls(event.EventLinkDelete)
+    @timed(HANDLER_SECONDS, 'link_delete')
+    def link_delete_handler(self, ev):
+        link = ev.link
+        # A port-status event may already have removed this link
+        if self._remove_link(link.src.dpid, link.dst.dpid):
+            self._topology_changed({'type': 'link_delete', 'src': link.src.dpid, 'dst': link.dst.dpid})
+
+    @set_ev_cls(ofp_event.EventOFPPortStatus, MAIN_DISPATCHER)
+    @timed(HANDLER_SECONDS, 'port_status')
+    def port_status_handler(self, ev):
+        msg = ev.msg
+        dp = msg.datapath
+        ofproto = dp.ofproto
+        port_no = msg.desc.port_no
+        if msg.reason == ofproto.OFPPR_DELETE:
+            self.switch_ports.get(dp.id, set()).discard(port_no)
+        elif port_no <= ofproto.OFPP_MAX:
+            self.switch_ports.setdefault(dp.id, set()).add(port_no)
+        down = (msg.reason == ofproto.OFPPR_DELETE or msg.desc.state & ofproto.OFPPS_LINK_DOWN
+                or msg.desc.config & ofproto.OFPPC_PORT_DOWN)
+        if down:
+            # React before LLDP times the link out: drop just the edge behind this port
+            nbr = self.port_neighbors.get((dp.id, port_no))
+            if nbr is not None and self._remove_link(dp.id, nbr):
+                self.logger.info(f"Port down: {dp.id}:{port_no}")
+                self._topology_changed({'type': 'link_delete', 'src': dp.id, 'dst': nbr, 'port': port_no})
+        else:
+            # Switch links come back through LLDP; hosts are re-attached here
+            changed = False
+            for mac, info in self.hosts.items():
+                if info['dpid'] == dp.id and info['port'] == port_no and \
+                        not self.net.has_edge(dp.id, f"host-{mac}"):
+                    changed = self._attach_host(mac) or changed
+            if changed:
+                self._topology_changed({'type': 'port_up', 'dpid': dp.id, 'port': port_no})
 
     @set_ev_cls(event.EventHostAdd)
+    @timed(HANDLER_SECONDS, 'host_add')
     def host_add_handler(self, ev):
         host = ev.host
-        mac = host.mac
         if not host.port:
             return
-        dpid = host.port.dpid
-        port = host.port.port_no
-        ip = host.ipv4[0] if host.ipv4 else None
+        self._add_host(host.mac, host.port.dpid, host.port.port_no, host.ipv4[0] if host.ipv4 else None)
+
+    def _add_host(self, mac, dpid, port, ip, source=None):
+        """Record a host at dpid:port (moving it if needed); returns False if nothing changed."""
+        node = f"host-{mac}"
+        old = self.hosts.get(mac)
+        if old is not None:
+            ip = ip or old['ip']
+            if (old['dpid'], old['port'], old['ip']) == (dpid, port, ip) and self.net.has_edge(node, dpid):
+                return False
+            if (old['dpid'], old['port']) != (dpid, port):
+                self._remove_link(node, old['dpid'])
+                # Reactive rules towards the old location would blackhole it
+                self._flush_reactive()
         self.hosts[mac] = {'dpid': dpid, 'port': port, 'ip': ip}
-        host_node = f"host-{mac}"
-        self.net.add_node(host_node, type='host', mac=mac, ip=ip)
+        if ip:
+            self.host_ips[ip] = mac
+        self.net.add_node(node, type='host', mac=mac, ip=ip)
+        self._attach_host(mac)
+        self.logger.info(f"Host added: {mac} at {dpid}:{port} ip={ip}{f' ({source})' if source else ''}")
+        change = {'type': 'host_add', 'mac': mac, 'dpid': dpid, 'port': port, 'ip': ip}
+        if source:
+            change['source'] = source
+        # Hosts are leaves hanging off switch trees, so no tree is dirty
+        self._topology_changed(change)
+        return True
+
+    def _forget_hosts_on(self, dpid, port_no):
+        # Like Ryu's host discovery: a host seen behind what turns out to be a
+        # switch link was traffic crossing it before LLDP found the link
+        node = self.port_neighbors.get((dpid, port_no))
+        if node is None or not is_host_node(node):
+            return
+        self._remove_link(node, dpid)
+        self.net.remove_node(node)
+        info = self.hosts.pop(node[len('host-'):], None)
+        if info is not None and info['ip']:
+            self.host_ips.pop(info['ip'], None)
+        self.logger.info(f"Host {node} forgotten: {dpid}:{port_no} is a switch link")
+
+    def set_mode(self, mode):
+        if mode != self.mode:
+            self.mode = mode
+            self._bump_generation({'type': 'mode', 'mode': mode})
+        if mode == 'dijkstra_load' and self._monitor is None:
+            self._monitor = hub.spawn(self._monitor_loop)
+
+    def _bump_generation(self, *changes):
+        self.generation += 1
+        for change in changes:
+            self.changes.append(dict(change, generation=self.generation))
+        changed, self._changed = self._changed, hub.Event()
+        changed.set()
+        # Reactive rules follow the paths of the old generation; new hosts don't move any
+        if self._reactive_dpids and any(change['type'] != 'host_add' for change in changes):
+            self._flush_reactive()
+
+    def _topology_changed(self, *changes):
+        self._bump_generation(*changes)
+        if not self.proactive:
+            return
+        # Debounce: the first event of a burst schedules one reroute for all of them
+        self._reroute_events += 1
+        if self._reroute_started is None:
+            self._reroute_started = time.time()
+            hub.spawn_after(REROUTE_DEBOUNCE, self._reroute)
+
+    def _reroute(self):
+        started, events = self._reroute_started, self._reroute_events
+        self._reroute_started = None
+        self._reroute_events = 0
+        # Only dirty trees are recomputed and only switches whose tables differ are reprogrammed
+        install = self.install_proactive_flows()
+        complete = install.wait()
+        end = install.finished if install.finished is not None else time.time()
+        elapsed_ms = round((end - started) * 1000.0, 3)
+        stats = self.convergence
+        stats['reroutes'] += 1
+        stats['last_ms'] = elapsed_ms
+        CONVERGENCE_SECONDS.observe(elapsed_ms / 1000.0)
+        stats['max_ms'] = elapsed_ms if stats['max_ms'] is None else max(stats['max_ms'], elapsed_ms)
+        stats['last_events'] = events
+        stats['last_flow_mods'] = sum(install.flow_mods.values())
+        if not complete:
+            stats['incomplete'] += 1
+        self.logger.info(f"Converged in {elapsed_ms} ms after {events} events: "
+                         f"{stats['last_flow_mods']} FlowMods on {len(install.flow_mods)} switches"
+                         f"{'' if complete else ' (barriers pending)'}")
+
+    def _set_port(self, dpid, nbr, port_no):
+        old = self.ports.get((dpid, nbr))
+        if old is not None:
+            self.port_neighbors.pop((dpid, old), None)
+        self.ports[(dpid, nbr)] = port_no
+        self.port_neighbors[(dpid, port_no)] = nbr
+
+    def _drop_port(self, dpid, nbr):
+        port_no = self.ports.pop((dpid, nbr), None)
+        if port_no is not None:
+            self.port_neighbors.pop((dpid, port_no), None)
+
+    def _attach_host(self, mac):
+        info = self.hosts[mac]
+        dpid = info['dpid']
+        if dpid not in self.switches:
+            return False
         # Connect host to switch in graph
-        self.net.add_edge(host_node, dpid, weight=0)
-        self.net.add_edge(dpid, host_node, weight=0)
-        self.logger.info(f"Host added: {mac} at {dpid}:{port} ip={ip}")
+        host_node = f"host-{mac}"
+        self.net.add_edge(host_node, dpid, weight=0, load_weight=0)
+        self.net.add_edge(dpid, host_node, weight=0, load_weight=0)
+        self._set_port(dpid, host_node, info['port'])
+        return True
+
+    def _remove_link(self, u, v):
+        """Remove both directions of a switch link or host attachment."""
+        removed = False
+        for a, b in ((u, v), (v, u)):
+            if self.net.has_edge(a, b):
+                # Host attachments are tree leaves and never dirty a tree
+                if not is_host_node(a) and not is_host_node(b):
+                    self._invalidate_edge(a, b)
+                self.net.remove_edge(a, b)
+                removed = True
+            self._drop_port(a, b)
+        if removed:
+            self.logger.info(f"Link deleted: {u} <-> {v}")
+        return removed
+
+    def _set_edge(self, u, v, weight, bw):
+        self._update_edge(u, v, {'weight': weight, 'bw': bw, 'load_weight': weight * self._load_factor(u, v)})
+
+    def _update_edge(self, u, v, attrs):
+        data = self.net.get_edge_data(u, v)
+        if data is None:
+            # Only trees the new link improves (or ties) become dirty
+            self._invalidate_where(lambda tree: tree.affected_by_new_edge(u, v, attrs))
+        else:
+            # Weight-only change: only trees of modes that read a changed weight can be dirty
+            changed = {key for key in ('weight', 'load_weight') if data.get(key) != attrs[key]}
+            if changed:
+                self._invalidate_where(lambda tree: weight_key(tree.mode) in changed and (
+                    tree.uses_edge(u, v) or tree.affected_by_new_edge(u, v, attrs)))
+        self.net.add_edge(u, v, **attrs)
+
+    def _load_factor(self, u, v):
+        # Links are treated as symmetric (reverse routes, LFA backups), so both
+        # directions take the weight of the busier one
+        level = max(self.port_load.level_of(u, self.ports.get((u, v))),
+                    self.port_load.level_of(v, self.ports.get((v, u))))
+        return self.port_load.factor(level)
+
+    def _reweight_link(self, u, v):
+        factor = self._load_factor(u, v)
+        for a, b in ((u, v), (v, u)):
+            data = self.net.get_edge_data(a, b)
+            if data is not None:
+                self._update_edge(a, b, dict(data, load_weight=data['weight'] * factor))
+
+    def _monitor_loop(self):
+        while self.mode == 'dijkstra_load':
+            # Requests go out to every switch at once; replies are folded in as they arrive
+            for dp in list(self.datapaths.values()):
+                dp.send_msg(dp.ofproto_parser.OFPPortStatsRequest(dp, 0, dp.ofproto.OFPP_ANY))
+            hub.sleep(LOAD_POLL_INTERVAL)
+        self._monitor = None
+
+    @set_ev_cls(ofp_event.EventOFPPortStatsReply, MAIN_DISPATCHER)
+    @timed(HANDLER_SECONDS, 'port_stats_reply')
+    def port_stats_reply_handler(self, ev):
+        dpid = ev.msg.datapath.id
+        changes = []
+        for stat in ev.msg.body:
+            nbr = self.port_neighbors.get((dpid, stat.port_no))
+            if nbr is None or is_host_node(nbr) or not self.net.has_edge(dpid, nbr):
+                continue
+            capacity = float(self.net[dpid][nbr].get('bw') or DEFAULT_BW) * 1e6 / 8  # Mbit/s -> bytes/s
+            stamp = stat.duration_sec + stat.duration_nsec * 1e-9
+            if self.port_load.sample(dpid, stat.port_no, stat.tx_bytes, stamp, capacity):
+                # Weights move only when a port changes level, not on every sample
+                self._reweight_link(dpid, nbr)
+                changes.append({'type': 'load', 'src': dpid, 'dst': nbr,
+                                'level': self.port_load.level_of(dpid, stat.port_no)})
+        if changes:
+            self.logger.info(f"Load level change on {dpid}: {[(c['dst'], c['level']) for c in changes]}")
+            self._topology_changed(*changes)
+
+    def _invalidate_where(self, predicate):
+        for trees in self._trees.values():
+            for src in [src for src, tree in trees.items() if predicate(tree)]:
+                del trees[src]
+
+    def _invalidate_node(self, node):
+        self._invalidate_where(lambda tree: tree.source == node or tree.uses_node(node))
+
+    def _invalidate_edge(self, u, v):
+        self._invalidate_where(lambda tree: tree.uses_edge(u, v))
 
     def compute_paths(self):
-        # Build routing for each pair of hosts
-        routes = {}
-        host_nodes = [n for n, d in self.net.nodes(data=True) if d.get('type') == 'host']
-        for i in range(len(host_nodes)):
-            for j in range(i + 1, len(host_nodes)):
-                src = host_nodes[i]
-                dst = host_nodes[j]
-                try:
-                    if self.mode == 'dijkstra_bw':
-                        path = nx.shortest_path(self.net, src, dst, weight='weight')
-                    else:
-                        # For hop count, treat each edge weight as 1
-                        path = nx.shortest_path(self.net, src, dst, weight=lambda u, v, d: 1)
-                    routes[(src, dst)] = path
-                except Exception as e:
-                    self.logger.warning(f"No path {src}->{dst}: {e}")
+        # Serve the whole route set from cache while nothing has changed
+        snapshot = self._routes_snapshot
+        if snapshot is not None and snapshot[0] == self.generation and snapshot[1] == self.mode:
+            COMPUTE_CACHE_HITS.inc()
+            return snapshot[2]
+
+        start = time.perf_counter()
+        routes = tree_routes(self.net, self.mode, self._current_trees())
+        COMPUTE_SECONDS.observe(time.perf_counter() - start, self.mode, self.backend)
+        self._routes_snapshot = (self.generation, self.mode, routes)
+        self._route_history[self.generation] = routes
+        while len(self._route_history) > ROUTE_HISTORY_SIZE:
+            self._route_history.popitem(last=False)
         return routes
 
-    def install_proactive_flows(self):
+    def wait_changes(self, since, timeout=EVENT_POLL_TIMEOUT):
+        """Block until the generation passes ``since``, then describe what changed.
+
+        Routes come as a delta against the set last published at ``since``;
+        a consumer that is new or behind gets the full set (``full``), and
+        ``truncated`` says the change log no longer reaches back to ``since``.
+        Returns None if nothing changed within ``timeout``.
+        """
+        if self.generation <= since:
+            self._changed.wait(timeout)
+            if self.generation <= since:
+                return None
+            # Let the rest of a burst land before computing routes
+            hub.sleep(REROUTE_DEBOUNCE)
+        routes = {f"{s}->{d}": p for (s, d), p in self.compute_paths().items()}
+        changes = [c for c in self.changes if c['generation'] > since]
+        result = {
+            'generation': self.generation,
+            'mode': self.mode,
+            'changes': changes,
+            'truncated': since >= 0 and (not changes or changes[0]['generation'] > since + 1),
+        }
+        published = self._published
+        if published is not None and published[0] == since:
+            result['routes'], result['removed'] = route_delta(published[1], routes)
+            result['full'] = False
+        else:
+            result['routes'] = routes
+            result['removed'] = []
+            result['full'] = True
+        self._published = (self.generation, routes)
+        return result
+
+    def query_routes(self, src=(None, None), dst=(None, None), since=None, cursor=None, limit=None,
+                     compact=False):
+        """One page of /routing/status.
+
+        ``src`` and ``dst`` are (host node, dpid) filters, see orient_route.
+        With ``since`` only routes changed after that generation are listed,
+        plus the ``removed`` ones on the first page; ``full`` says that
+        generation is no longer kept and every route is listed instead.
+        ``limit`` cuts the listing and ``next`` is the cursor to continue it,
+        valid only while the generation stays the same (StaleCursor after).
+        ``compact`` lists nodes once and paths as indexes into that table.
+        """
         routes = self.compute_paths()
-        # For each route, install flows on switches along the path
+        generation = self.generation
+        start = 0
+        if cursor is not None:
+            try:
+                cursor_generation, start = (int(part) for part in cursor.split(':'))
+            except ValueError:
+                raise ValueError(f"malformed cursor {cursor!r}")
+            if cursor_generation != generation:
+                raise StaleCursor(f"cursor is for generation {cursor_generation}, now at {generation}")
+
+        result = {'mode': self.mode, 'generation': generation}
+        removed = []
+        if since is not None:
+            base = self._route_history.get(since)
+            result['since'] = since
+            result['full'] = base is None
+            if base is not None:
+                cache = self._delta_cache
+                if cache is None or cache[:2] != (since, generation):
+                    cache = self._delta_cache = (since, generation) + route_delta(base, routes)
+                routes = cache[2]
+                if cursor is None:
+                    removed = [base[key] for key in cache[3]]
+
+        filtered = src != (None, None) or dst != (None, None)
+        page = []
+        offset = start
+        # islice skips already-served routes at C speed; filters only run on the rest
+        for path in itertools.islice(routes.values(), start, None):
+            offset += 1
+            if filtered:
+                path = orient_route(path, src, dst)
+                if path is None:
+                    continue
+            page.append(path)
+            if limit is not None and len(page) == limit:
+                break
+        if filtered:
+            removed = [p for p in (orient_route(path, src, dst) for path in removed) if p is not None]
+        result['next'] = f"{generation}:{offset}" if limit is not None and offset < len(routes) else None
+
+        if compact:
+            index = {}
+            nodes = result['nodes'] = []
+
+            def ids(path):
+                out = []
+                for node in path:
+                    i = index.get(node)
+                    if i is None:
+                        i = index[node] = len(nodes)
+                        nodes.append(node)
+                    out.append(i)
+                return out
+            result['routes'] = [ids(path) for path in page]
+            removed = [ids((path[0], path[-1])) for path in removed]
+        else:
+            result['routes'] = {f"{path[0]}->{path[-1]}": path for path in page}
+            removed = [f"{path[0]}->{path[-1]}" for path in removed]
+        if since is not None:
+            result['removed'] = removed
+        return result
+
+    def resolve_host(self, value):
+        """Host node for a MAC, 'host-<mac>' node or IPv4 address; None if unknown."""
+        if not value:
+            return None
+        mac = self.host_ips.get(value)
+        if mac is None or self.hosts[mac]['ip'] != value:
+            mac = host_node(value)[len('host-'):]
+        return f"host-{mac}" if mac in self.hosts else None
+
+    def find_path(self, src, dst):
+        """Route between two host nodes with its ports, total weight and bottleneck bw.
+
+        Answered from the shortest-path tree of one switch, cached or built
+        on demand, without computing any other pair. The route is the one
+        /routing/status lists and the flows follow (the canonical tree of the
+        pair, reversed when needed); in 'ecmp' mode switches may also spread
+        traffic over equal-cost siblings. Raises KeyError for a host that is
+        unknown or not attached; returns None if there is no path.
+        """
+        ends = []
+        for node in (src, dst):
+            info = self.hosts.get(node[len('host-'):])
+            if info is None or not self.net.has_edge(node, info['dpid']):
+                raise KeyError(node)
+            ends.append(info['dpid'])
+        order = self._host_order
+        if order is None or order[0] != self.generation:
+            order = self._host_order = (self.generation, {h: i for i, (h, _) in enumerate(host_attachments(self.net))})
+        reverse = order[1][src] > order[1][dst]
+        root, target = (ends[1], ends[0]) if reverse else (ends[0], ends[1])
+        tree = self._tree(root)
+        sw_path = tree.path_to(target) if tree is not None else None
+        if sw_path is None:
+            return None
+        sw_path = sw_path[::-1] if reverse else sw_path
+        path = [src] + sw_path + [dst]
+        hops = [{'dpid': sw, 'in_port': self.ports.get((sw, prev)), 'out_port': self.ports.get((sw, nxt))}
+                for prev, sw, nxt in zip(path, path[1:], path[2:])]
+        bws = [self.net[u][v].get('bw', DEFAULT_BW) for u, v in zip(sw_path, sw_path[1:])]
+        return {'src': src, 'dst': dst, 'path': path, 'hops': hops, 'weight': tree.distance(target),
+                'bottleneck_bw': min(bws) if bws else None}
+
+    def _tree(self, source):
+        trees = self._current_trees()
+        tree = trees.get(source)
+        if tree is None and self.backend != 'csr' and self.net.has_node(source):
+            tree = trees[source] = ShortestPathTree.build(self.net, source, self.mode)
+        return tree
+
+    def _current_trees(self):
+        if self.backend == 'csr':
+            return self._csr_trees()
+        # One shortest-path tree per source switch; only dirty trees are rebuilt
+        return self._trees.setdefault(self.mode, {})
+
+    def _csr_trees(self):
+        # The CSR backend recomputes all source switches in one batched call
+        # whenever the generation changes, instead of tracking dirty trees.
+        cache = self._csr_cache
+        if cache is None or cache[0] != self.generation or cache[1] != self.mode:
+            topo = CSRTopology.from_graph(self.net, weight_key(self.mode) or 'weight')
+            sources = {sw for _, sw in host_attachments(self.net)}
+            cache = self._csr_cache = (self.generation, self.mode, csr_trees(topo, self.mode, sources))
+        return cache[2]
+
+    def install_proactive_flows(self):
+        self.proactive = True
+        install = self._sync_flows(self._compile_flows(self.compute_paths()))
+        install.rules = dict(self.flow_stats)
+        return install
+
+    def send_barriers(self, dpids):
+        """Send a bare barrier to each switch; unknown dpids are skipped.
+
+        OpenFlow keeps order on a switch connection, so the returned install
+        completes once everything sent before it, by any app, has been applied.
+        """
+        install = FlowInstall()
+        for dpid in dpids:
+            dp = self.datapaths.get(dpid)
+            if dp is not None:
+                self._send_batch(dp, [], install)
+        install.seal()
+        return install
+
+    def _compile_flows(self, routes):
+        """Desired flow tables, dpid -> {(priority, match): action}, for both directions of each route.
+
+        Routes crossing a switch towards the same destination collapse into one
+        eth_dst rule on the next hop most of them agree on; sources that
+        disagree keep an exact (eth_src, eth_dst) rule at a higher priority.
+        In 'ecmp' mode every switch on the shortest-path DAG towards a host
+        instead spreads traffic over all of its equal-cost next hops.
+        """
+        # Everything below is plain dict lookups; no topology API queries per hop.
+        ports = self.ports
+        nodes = self.net.nodes
+        votes = {}  # (switch, dst node) -> {out_port: [src nodes]}
+        route_rules = 0
         for (src, dst), path in routes.items():
             # host nodes look like 'host-<mac>'
             if not path:
                 continue
-            # convert host to attachment switch and ip if available
-            # iterate path and install simple L2 forwarding based on dst MAC
-            dst_mac = self.net.nodes[dst].get('mac')
-            for idx in range(1, len(path)-1):
-                sw = path[idx]
-                next_hop = path[idx+1]
-                # find output port towards next_hop
-                out_port = self._port_to_neighbor(sw, next_hop)
-                if out_port is None:
+            for route, src_node, dst_node in ((path, src, dst), (path[::-1], dst, src)):
+                for idx in range(1, len(route)-1):
+                    sw = route[idx]
+                    # output port towards next_hop
+                    out_port = ports.get((sw, route[idx+1]))
+                    if out_port is None:
+                        continue
+                    votes.setdefault((sw, dst_node), {}).setdefault(out_port, []).append(src_node)
+                    route_rules += 1
+
+        trees = self._current_trees() if self.fast_failover or self.mode == 'ecmp' else None
+        if self.mode == 'ecmp':
+            dst_actions = self._ecmp_actions(trees)
+            votes = {}
+        else:
+            dst_actions = {}
+            for key, choices in votes.items():
+                out_port = max(choices, key=lambda p: (len(choices[p]), -p))
+                dst_actions[key] = self._forward_action(trees, key[0], key[1], out_port)
+
+        desired = {}
+        ipv4_dsts = {}  # switch -> {dst ip: action}
+        for (sw, dst_node), action in dst_actions.items():
+            table = desired.setdefault(sw, {})
+            dst_mac = nodes[dst_node].get('mac')
+            ip = nodes[dst_node].get('ip') if self.flow_aggregation == 'ipv4' else None
+            if ip:
+                ipv4_dsts.setdefault(sw, {})[ip] = action
+            else:
+                # simple L2 forwarding based on dst MAC
+                table[(FLOW_PRIORITY, (('eth_dst', dst_mac),))] = action
+        for (sw, dst_node), choices in votes.items():
+            table = desired[sw]
+            dst_mac = nodes[dst_node].get('mac')
+            out_port = max(choices, key=lambda p: (len(choices[p]), -p))
+            for port, srcs in choices.items():
+                if port == out_port:
+                    continue
+                for src_node in srcs:
+                    match = (('eth_dst', dst_mac), ('eth_src', nodes[src_node].get('mac')))
+                    table[(FLOW_PRIORITY + 1, match)] = self._forward_action(trees, sw, dst_node, port)
+        # Prefixes from collapse_addresses are disjoint, so one priority is enough.
+        # ARP and other non-IPv4 traffic is left to the table-miss path in this mode.
+        for sw, dsts in ipv4_dsts.items():
+            table = desired[sw]
+            for net, action in aggregate_ipv4(dsts):
+                ipv4_dst = str(net.network_address) if net.prefixlen == 32 else \
+                    (str(net.network_address), str(net.netmask))
+                table[(FLOW_PRIORITY, (('eth_type', 0x0800), ('ipv4_dst', ipv4_dst)))] = action
+
+        rules = sum(len(table) for table in desired.values())
+        self.flow_stats = {'route_rules': route_rules, 'rules': rules, 'saved': route_rules - rules}
+        self.logger.info(f"Flow compiler: {route_rules} route rules -> {rules} rules")
+        return desired
+
+    def _ecmp_actions(self, trees):
+        """(switch, dst host node) -> action for every switch on the shortest-path DAG to each host.
+
+        Walks the DAG from every switch with hosts towards the destination
+        switch. Several equal-cost next hops become one ('select', buckets)
+        action weighted by link bandwidth; a single one keeps the usual action.
+        """
+        net = self.net
+        attachments = host_attachments(net)
+        sources = {sw for _, sw in attachments}
+        actions = {}
+        for dst_node, dst_sw in attachments:
+            tree = trees.get(dst_sw)
+            port = self.ports.get((dst_sw, dst_node))
+            if tree is None or port is None:
+                continue
+            actions[(dst_sw, dst_node)] = ('output', port)
+            seen = {dst_sw}
+            stack = [sw for sw in sources if sw not in seen]
+            while stack:
+                sw = stack.pop()
+                if sw in seen:
+                    continue
+                seen.add(sw)
+                hops = [nbr for nbr in equal_cost_next_hops(net, tree, sw) if (sw, nbr) in self.ports]
+                if not hops:
                     continue
-                # send flow mod to switch
-                self._add_flow_to_switch(sw, dst_mac, out_port)
+                stack.extend(hops)
+                if len(hops) == 1:
+                    actions[(sw, dst_node)] = self._forward_action(trees, sw, dst_node, self.ports[(sw, hops[0])])
+                else:
+                    buckets = tuple(sorted((self.ports[(sw, nbr)], max(1, int(round(net[sw][nbr].get('bw') or 1))))
+                                           for nbr in hops))
+                    actions[(sw, dst_node)] = ('select', buckets)
+        return actions
+
+    def _forward_action(self, trees, sw, dst_node, out_port):
+        """('output', port), or ('ff', port, backup port) when a loop-free backup exists."""
+        if trees is None or not self.fast_failover:
+            return ('output', out_port)
+        primary = self.port_neighbors.get((sw, out_port))
+        dst_sw = self.hosts.get(self.net.nodes[dst_node].get('mac'), {}).get('dpid')
+        tree = trees.get(dst_sw)
+        # The last hop to a host has no alternative
+        if tree is None or primary is None or is_host_node(primary):
+            return ('output', out_port)
+        backup = tree.backup_next_hop(self.net, sw, primary, trees.get(sw))
+        backup_port = self.ports.get((sw, backup)) if backup is not None else None
+        if backup_port is None:
+            return ('output', out_port)
+        return ('ff', out_port, backup_port)
+
+    def _sync_flows(self, desired):
+        """Send only the FlowMods that turn each shadow table into the desired one."""
+        install = FlowInstall()
+        for dpid, dp in self.datapaths.items():
+            old = self.flow_tables.setdefault(dpid, {})
+            new = desired.get(dpid, {})
+            msgs = []
+            sent = collections.Counter()
+            # Groups must exist before the flows that point at them
+            groups = self.group_tables.setdefault(dpid, {})
+            needed = {action for action in new.values() if action[0] in GROUP_ACTIONS}
+            added = sorted(needed - set(groups))
+            for action in added:
+                groups[action] = self._allocate_group(dpid)
+            if added:
+                # The switch keeps groups across a controller restart and ours start
+                # from GROUP_ID_BASE again: clear each id so its ADD can't hit GROUP_EXISTS
+                for action in added:
+                    msgs.append(self._group_mod(dp, groups[action], action, dp.ofproto.OFPGC_DELETE))
+                msgs.append(dp.ofproto_parser.OFPBarrierRequest(dp))
+            for action in added:
+                msgs.append(self._group_mod(dp, groups[action], action, dp.ofproto.OFPGC_ADD))
+                sent['group_add'] += 1
+            if msgs:
+                msgs.append(dp.ofproto_parser.OFPBarrierRequest(dp))
+            for key, action in new.items():
+                prev = old.get(key)
+                if prev is None:
+                    msgs.append(self._flow_mod(dp, key, action, dp.ofproto.OFPFC_ADD))
+                    sent['add'] += 1
+                elif prev != action:
+                    msgs.append(self._flow_mod(dp, key, action, dp.ofproto.OFPFC_MODIFY_STRICT))
+                    sent['modify'] += 1
+            for key in old:
+                if key not in new:
+                    msgs.append(self._flow_mod(dp, key, None, dp.ofproto.OFPFC_DELETE_STRICT))
+                    sent['delete'] += 1
+            # Unused groups go last, once no flow references them: deleting a group also
+            # deletes the flows still pointing at it, so the switch must not reorder these
+            unused = sorted(set(groups) - needed)
+            if unused and msgs:
+                msgs.append(dp.ofproto_parser.OFPBarrierRequest(dp))
+            for action in unused:
+                group_id = groups.pop(action)
+                msgs.append(self._group_mod(dp, group_id, action, dp.ofproto.OFPGC_DELETE))
+                self._owned_groups.get(dpid, set()).discard(group_id)
+                sent['group_delete'] += 1
+            if msgs:
+                self.flow_tables[dpid] = dict(new)
+                self._send_batch(dp, msgs, install, sum(sent.values()))
+                for command, count in sent.items():
+                    install.commands[command] += count
+                    OPENFLOW_COMMANDS.inc(dpid, command, amount=count)
+        install.seal()
+        return install
 
     def _port_to_neighbor(self, dpid, neighbor):
-        # Try to find port number by inspecting switches list via topology API
-        # This is a best-effort placeholder; real implementation should map ports from link info
-        # Return None if unknown
-        return 1
+        # Output port learned from link or host discovery; None if unknown
+        return self.ports.get((dpid, neighbor))
+
+    def _flow_mod(self, dp, key, action, command):
+        ofproto = dp.ofproto
+        parser = dp.ofproto_parser
+        priority, match_fields = key
+        match = parser.OFPMatch(**dict(match_fields))
+        if command == ofproto.OFPFC_DELETE_STRICT:
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug(f"Delete flow on {dp.id}: {dict(match_fields)}")
+            return parser.OFPFlowMod(datapath=dp, cookie=FLOW_COOKIE, command=command, priority=priority,
+                                     match=match, out_port=ofproto.OFPP_ANY, out_group=ofproto.OFPG_ANY)
+        if action[0] in GROUP_ACTIONS:
+            actions = [parser.OFPActionGroup(self.group_tables[dp.id][action])]
+        else:
+            actions = [parser.OFPActionOutput(action[1])]
+        inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS, actions)]
+        # Per-flow lines only at debug level; the f-string alone is a cost at scale
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(f"Install flow on {dp.id}: {dict(match_fields)} -> {action}")
+        return parser.OFPFlowMod(datapath=dp, cookie=FLOW_COOKIE, command=command, priority=priority,
+                                 match=match, instructions=inst)
+
+    def _allocate_group(self, dpid):
+        group_id = self._next_group_id.get(dpid, GROUP_ID_BASE)
+        self._next_group_id[dpid] = group_id + 1
+        self._owned_groups.setdefault(dpid, set()).add(group_id)
+        return group_id
 
-    def _add_flow_to_switch(self, dpid, dst_mac, out_port, priority=100):
-        # Placeholder: in a real implementation we would get Datapath object and send ofproto messages
-        self.logger.info(f"Install flow on {dpid}: dst_mac={dst_mac} -> out_port={out_port}")
+    def _group_mod(self, dp, group_id, action, command):
+        ofproto = dp.ofproto
+        parser = dp.ofproto_parser
+        group_type = ofproto.OFPGT_SELECT if action[0] == 'select' else ofproto.OFPGT_FF
+        if command == ofproto.OFPGC_DELETE:
+            return parser.OFPGroupMod(dp, command, group_type, group_id, [])
+        if action[0] == 'select':
+            # The switch hashes each flow onto a live bucket in proportion to its weight
+            buckets = [parser.OFPBucket(weight=weight, watch_port=port, watch_group=ofproto.OFPG_ANY,
+                                        actions=[parser.OFPActionOutput(port)]) for port, weight in action[1]]
+        else:
+            # The switch uses the first bucket whose watch port is live
+            buckets = [parser.OFPBucket(watch_port=port, watch_group=ofproto.OFPG_ANY,
+                                        actions=[parser.OFPActionOutput(port)]) for port in action[1:]]
+        return parser.OFPGroupMod(dp, command, group_type, group_id, buckets)
+
+    def _delete_own_flows(self, dp):
+        ofproto = dp.ofproto
+        parser = dp.ofproto_parser
+        # The 32-bit mask also catches the reactive rules (REACTIVE_COOKIE)
+        dp.send_msg(parser.OFPFlowMod(datapath=dp, cookie=FLOW_COOKIE, cookie_mask=0xffffffff,
+                                      table_id=ofproto.OFPTT_ALL, command=ofproto.OFPFC_DELETE,
+                                      out_port=ofproto.OFPP_ANY, out_group=ofproto.OFPG_ANY))
+        # Only the groups we allocated; other apps' groups stay
+        for group_id in sorted(self._owned_groups.pop(dp.id, ())):
+            dp.send_msg(parser.OFPGroupMod(dp, ofproto.OFPGC_DELETE, ofproto.OFPGT_FF, group_id, []))
+        self._next_group_id[dp.id] = GROUP_ID_BASE
+
+    def _send_batch(self, dp, msgs, install, count=0):
+        # Serialize the messages plus a closing barrier into a single socket write;
+        # count is how many of them are Flow/GroupMods, for the install report
+        barrier = dp.ofproto_parser.OFPBarrierRequest(dp)
+        buf = bytearray()
+        for msg in msgs + [barrier]:
+            dp.set_xid(msg)
+            msg.serialize()
+            buf += msg.buf
+        install.barrier_sent(dp.id, barrier.xid, count)
+        self._installs[(dp.id, barrier.xid)] = install
+        if not dp.send(bytes(buf)):
+            self._installs.pop((dp.id, barrier.xid), None)
+            install.abandon(dp.id)
+
+    @set_ev_cls(ofp_event.EventOFPBarrierReply, MAIN_DISPATCHER)
+    @timed(HANDLER_SECONDS, 'barrier_reply')
+    def barrier_reply_handler(self, ev):
+        msg = ev.msg
+        install = self._installs.pop((msg.datapath.id, msg.xid), None)
+        if install is not None:
+            install.barrier_replied(msg.datapath.id)
+
+    @set_ev_cls(ofp_event.EventOFPPacketIn, MAIN_DISPATCHER)
+    @timed(HANDLER_SECONDS, 'packet_in')
+    def packet_in_handler(self, ev):
+        msg = ev.msg
+        dp = msg.datapath
+        # Only misses of our own table-miss rule; other apps' punts (LLDP...) are theirs
+        if not self.reactive or msg.cookie != FLOW_COOKIE:
+            return
+        if not self._admit_packet_in(dp.id):
+            PACKET_INS.inc(dp.id, 'rate_limited')
+            return
+        PACKET_INS.inc(dp.id, self._handle_miss(dp, msg))
+
+    def _admit_packet_in(self, dpid):
+        # Token bucket: a flooding switch gets PACKET_IN_RATE/s, not the whole event loop
+        now = time.time()
+        tokens, last = self._packet_in_budget.get(dpid, (PACKET_IN_BURST, now))
+        tokens = min(PACKET_IN_BURST, tokens + (now - last) * PACKET_IN_RATE)
+        admitted = tokens >= 1
+        self._packet_in_budget[dpid] = (tokens - 1 if admitted else tokens, now)
+        return admitted
+
+    def _handle_miss(self, dp, msg):
+        """Learn the sender and forward one missed packet; returns the outcome for the metrics."""
+        eth, next_cls, payload = ethernet.ethernet.parser(msg.data)
+        if eth.ethertype == ether_types.ETH_TYPE_LLDP:
+            return 'ignored'
+        in_port = msg.match['in_port']
+        nbr = self.port_neighbors.get((dp.id, in_port))
+        from_switch = nbr is not None and not is_host_node(nbr)
+        if not from_switch and not is_multicast_mac(eth.src):
+            self._learn_sender(dp.id, in_port, eth.src, next_cls, payload)
+        info = self.hosts.get(eth.dst)
+        if info is None or not self.net.has_edge(f"host-{eth.dst}", info['dpid']):
+            # Floods never go out on switch links, so one arriving from a link is a stray copy
+            return 'ignored' if from_switch else self._flood(dp, msg, in_port, eth)
+        pending = self._reactive_pending.get(eth.dst)
+        if pending is not None and pending[0].finished is None and dp.id in pending[1] and \
+                time.time() - pending[0].started < INSTALL_TIMEOUT:
+            # The path is on its way but not applied here yet: pass the packet along it
+            dp.send_msg(self._packet_out(dp, msg, [pending[1][dp.id]]))
+            return 'pending'
+        return self._install_path(dp, msg, in_port, eth)
+
+    def _learn_sender(self, dpid, port, mac, next_cls, payload):
+        ip = None
+        try:
+            if next_cls is arp.arp:
+                ip = arp.arp.parser(payload)[0].src_ip
+            elif next_cls is ipv4.ipv4:
+                ip = ipv4.ipv4.parser(payload)[0].src
+        except struct.error:  # truncated or malformed header
+            pass
+        self._add_host(mac, dpid, port, ip if ip != '0.0.0.0' else None, source='packet_in')
+
+    def _install_path(self, dp, msg, in_port, eth):
+        """Install the route from this switch to eth.dst, one batch per switch.
+
+        The route comes from the cached tree of the destination's switch, so
+        the rules are per destination and any later sender on the way reuses
+        them. When the sender sits on this switch, rules back to it go out in
+        the same batches. The missed packet is released through the new rule
+        at the ingress, from the switch buffer when it kept one.
+        """
+        dst_node = f"host-{eth.dst}"
+        tree = self._tree(self.hosts[eth.dst]['dpid'])
+        sw_path = tree.path_to(dp.id) if tree is not None else None
+        if sw_path is None:
+            return 'no_path'
+        sw_path = sw_path[::-1]
+        hops = {sw: self.ports.get((sw, nxt)) for sw, nxt in zip(sw_path, sw_path[1:] + [dst_node])}
+        if None in hops.values():
+            return 'no_path'
+        rules = {sw: [(eth.dst, port)] for sw, port in hops.items()}
+        src = self.hosts.get(eth.src)
+        if src is not None and (src['dpid'], src['port']) == (dp.id, in_port):
+            for sw, prev in zip(sw_path, [f"host-{eth.src}"] + sw_path):
+                port = self.ports.get((sw, prev))
+                if port is not None:
+                    rules[sw].append((eth.src, port))
+        install = FlowInstall()
+        # Egress first, so the released packet mostly finds the rest of the path ready
+        for sw in reversed(sw_path):
+            sw_dp = self.datapaths.get(sw)
+            if sw_dp is None:
+                continue
+            msgs = [self._reactive_flow_mod(sw_dp, mac, port) for mac, port in rules[sw]]
+            if sw == dp.id:
+                msgs.append(self._packet_out(dp, msg, [dp.ofproto.OFPP_TABLE]))
+            self._send_batch(sw_dp, msgs, install, len(rules[sw]))
+            self._reactive_dpids.add(sw)
+            OPENFLOW_COMMANDS.inc(sw, 'reactive_add', amount=len(rules[sw]))
+        install.seal()
+        self._reactive_pending[eth.dst] = (install, hops)
+        return 'installed'
+
+    def _flood(self, dp, msg, in_port, eth):
+        """Copy a broadcast or unknown-destination packet to every edge port, never onto switch links."""
+        now = time.time()
+        recent = self._recent_floods
+        while recent and next(iter(recent.values())) < now - FLOOD_DEDUP_WINDOW:
+            recent.popitem(last=False)
+        key = (eth.src, eth.dst, hash(msg.data))
+        if key in recent:
+            return 'ignored'
+        recent[key] = now
+        # A truncated packet (the rest is in the ingress buffer) can only leave the ingress switch
+        complete = len(msg.data) == msg.total_len
+        for dpid, sw_dp in self.datapaths.items():
+            if dpid != dp.id and not complete:
+                continue
+            ports = [port for port in sorted(self.switch_ports.get(dpid, ()))
+                     if not (dpid == dp.id and port == in_port) and not self._is_link_port(dpid, port)]
+            if dpid == dp.id:
+                # With no port left, an empty packet-out still frees the switch buffer
+                if ports or msg.buffer_id != dp.ofproto.OFP_NO_BUFFER:
+                    sw_dp.send_msg(self._packet_out(dp, msg, ports))
+            elif ports:
+                parser = sw_dp.ofproto_parser
+                sw_dp.send_msg(parser.OFPPacketOut(
+                    datapath=sw_dp, buffer_id=sw_dp.ofproto.OFP_NO_BUFFER, in_port=sw_dp.ofproto.OFPP_CONTROLLER,
+                    actions=[parser.OFPActionOutput(port) for port in ports], data=msg.data))
+        return 'flooded'
+
+    def _is_link_port(self, dpid, port_no):
+        nbr = self.port_neighbors.get((dpid, port_no))
+        return nbr is not None and not is_host_node(nbr)
+
+    def _packet_out(self, dp, msg, ports):
+        # Reuses the switch's buffer when it kept the packet; otherwise sends the data back
+        ofproto = dp.ofproto
+        parser = dp.ofproto_parser
+        buffered = msg.buffer_id != ofproto.OFP_NO_BUFFER
+        return parser.OFPPacketOut(datapath=dp, buffer_id=msg.buffer_id, in_port=msg.match['in_port'],
+                                   actions=[parser.OFPActionOutput(port) for port in ports],
+                                   data=None if buffered else msg.data)
+
+    def _install_table_miss(self, dp):
+        ofproto = dp.ofproto
+        parser = dp.ofproto_parser
+        # Only the first MISS_SEND_LEN bytes go up when the switch can buffer the packet
+        actions = [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER, MISS_SEND_LEN)]
+        dp.send_msg(parser.OFPFlowMod(datapath=dp, cookie=FLOW_COOKIE, priority=0, match=parser.OFPMatch(),
+                                      instructions=[parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS,
+                                                                                 actions)]))
+
+    def _reactive_flow_mod(self, dp, mac, port):
+        ofproto = dp.ofproto
+        parser = dp.ofproto_parser
+        actions = [parser.OFPActionOutput(port)]
+        return parser.OFPFlowMod(datapath=dp, cookie=REACTIVE_COOKIE, priority=REACTIVE_PRIORITY,
+                                 idle_timeout=REACTIVE_IDLE_TIMEOUT, match=parser.OFPMatch(eth_dst=mac),
+                                 instructions=[parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS, actions)])
+
+    def _flush_reactive(self):
+        # One cookie-masked delete per switch; the next packets re-resolve on the current graph
+        for dpid in self._reactive_dpids:
+            dp = self.datapaths.get(dpid)
+            if dp is None:
+                continue
+            ofproto = dp.ofproto
+            dp.send_msg(dp.ofproto_parser.OFPFlowMod(
+                datapath=dp, cookie=REACTIVE_COOKIE, cookie_mask=0xffffffffffffffff, table_id=ofproto.OFPTT_ALL,
+                command=ofproto.OFPFC_DELETE, out_port=ofproto.OFPP_ANY, out_group=ofproto.OFPG_ANY))
+        self._reactive_dpids.clear()
+        self._reactive_pending.clear()
 
 
 class RoutingController(ControllerBase):
@@ -119,27 +1234,128 @@ class RoutingController(ControllerBase):
         super(RoutingController, self).__init__(req, link, data, **config)
         self.app = data['app']
 
+    @route('set_mode', '/routing/mode', methods=['POST'])
     def set_mode(self, req, **_kwargs):
         try:
             data = req.json if hasattr(req, 'json') else json.loads(req.body.decode('utf-8'))
         except Exception:
             data = {}
         mode = data.get('mode') if isinstance(data, dict) else None
-        if mode not in ('dijkstra_bw', 'shortest_hops'):
-            return (400, {}, json.dumps({'error': 'invalid mode'}))
-        self.app.mode = mode
-        # Recompute and install flows proactively
-        self.app.install_proactive_flows()
-        return (200, {}, json.dumps({'message': f'mode set to {mode}'}))
+        if mode not in MODES:
+            return json_response(json.dumps({'error': 'invalid mode'}), 400)
+        self.app.set_mode(mode)
+        # Recompute and install flows proactively, then wait for the barriers
+        install = self.app.install_proactive_flows()
+        install.wait()
+        return json_response(json.dumps({'message': f'mode set to {mode}', 'install': install.report()}))
+
+    @route('barrier', '/routing/barrier', methods=['POST'])
+    def barrier(self, req, **_kwargs):
+        # Body: {"dpids": [...]}; answers once every listed switch replied or INSTALL_TIMEOUT passed
+        try:
+            data = req.json if hasattr(req, 'json') else json.loads(req.body.decode('utf-8'))
+            dpids = [int(dpid) for dpid in data['dpids']]
+        except Exception:
+            return json_response(json.dumps({'error': 'expected {"dpids": [...]}'}), 400)
+        missing = [dpid for dpid in dpids if dpid not in self.app.datapaths]
+        install = self.app.send_barriers(dpids)
+        install.wait()
+        return json_response(json.dumps(dict(install.report(), missing=missing)))
 
+    @route('get_load', '/routing/load', methods=['GET'])
+    def get_load(self, req, **_kwargs):
+        table = self.app.port_load
+        ports = {f"{dpid}:{port}": {'utilization': round(table.utilization(dpid, port), 4),
+                                    'level': table.level_of(dpid, port)}
+                 for dpid, port in table.slots}
+        return json_response(json.dumps({'interval': LOAD_POLL_INTERVAL, 'thresholds': LOAD_THRESHOLDS,
+                                         'ports': ports}))
+
+    @route('get_convergence', '/routing/convergence', methods=['GET'])
+    def get_convergence(self, req, **_kwargs):
+        return json_response(json.dumps(dict(self.app.convergence, generation=self.app.generation)))
+
+    @route('get_events', '/routing/events', methods=['GET'])
+    def get_events(self, req, **_kwargs):
+        # Long-poll: /routing/events?since=<generation>&timeout=<seconds>
+        try:
+            since = int(req.GET.get('since', -1))
+            timeout = min(float(req.GET.get('timeout', EVENT_POLL_TIMEOUT)), EVENT_POLL_TIMEOUT)
+        except ValueError:
+            return json_response(json.dumps({'error': 'since and timeout must be numbers'}), 400)
+        result = self.app.wait_changes(since, timeout)
+        if result is None:
+            result = {'generation': self.app.generation, 'mode': self.app.mode, 'changes': [],
+                      'truncated': False, 'routes': {}, 'removed': [], 'full': False}
+        return json_response(json.dumps(result))
+
+    def _path_entry(self, src, dst):
+        # (status, body) for one pair of /routing/path
+        nodes = [self.app.resolve_host(value) for value in (src, dst)]
+        unknown = [value for value, node in zip((src, dst), nodes) if node is None]
+        if unknown:
+            return 404, {'src': src, 'dst': dst, 'error': f"unknown host {unknown[0]}"}
+        try:
+            result = self.app.find_path(*nodes)
+        except KeyError as e:
+            return 404, {'src': src, 'dst': dst, 'error': f"host {e.args[0]} is not attached"}
+        if result is None:
+            return 404, {'src': src, 'dst': dst, 'error': 'no path'}
+        return 200, result
+
+    @route('get_path', '/routing/path', methods=['GET'])
+    def get_path(self, req, **_kwargs):
+        # /routing/path?src=<host>&dst=<host>; a host is a MAC, host-<mac> or its IPv4 address
+        src, dst = req.GET.get('src'), req.GET.get('dst')
+        if not src or not dst:
+            return json_response(json.dumps({'error': 'src and dst are required'}), 400)
+        status, result = self._path_entry(src, dst)
+        result.update(mode=self.app.mode, generation=self.app.generation)
+        return json_response(dumps(result), status)
+
+    @route('get_paths', '/routing/path', methods=['POST'])
+    def get_paths(self, req, **_kwargs):
+        # Batch: POST /routing/path with {"pairs": [[src, dst], ...]}; failed pairs carry an 'error'
+        try:
+            data = req.json if hasattr(req, 'json') else json.loads(req.body.decode('utf-8'))
+            pairs = [(str(src), str(dst)) for src, dst in data['pairs']]
+        except Exception:
+            return json_response(json.dumps({'error': 'expected {"pairs": [[src, dst], ...]}'}), 400)
+        paths = [self._path_entry(src, dst)[1] for src, dst in pairs]
+        return json_response(dumps({'mode': self.app.mode, 'generation': self.app.generation, 'paths': paths}))
+
+    @route('get_switches', '/routing/switches', methods=['GET'])
+    def get_switches(self, req, **_kwargs):
+        # Connected dpids; servidor.py counts them to know the topology is up
+        return json_response(json.dumps(sorted(self.app.switches)))
+
+    @route('get_metrics', '/metrics', methods=['GET'])
+    def get_metrics(self, req, **_kwargs):
+        return Response(content_type=CONTENT_TYPE, text=REGISTRY.render())
+
+    @route('get_status', '/routing/status', methods=['GET'])
     def get_status(self, req, **_kwargs):
-        routes = self.app.compute_paths()
-        # return a compact summary
-        summary = {f"{s}->{d}": p for (s, d), p in routes.items()}
-        return (200, {}, json.dumps({'mode': self.app.mode, 'routes': summary}))
-
-    # mapper binding
-    @classmethod
-    def register(cls, mapper):
-        mapper.connect('set_mode', '/routing/mode', controller=cls, action='set_mode', conditions=dict(method=['POST']))
-        mapper.connect('get_status', '/routing/status', controller=cls, action='get_status', conditions=dict(method=['GET']))
+        # /routing/status?src=&dst=&src_dpid=&dst_dpid=&since=&limit=&cursor=&format=compact
+        # src/dst take a MAC or a host-<mac> node; no parameters lists every route
+        params = req.GET
+
+        def number(name):
+            value = params.get(name)
+            return None if value in (None, '') else int(value)
+
+        try:
+            src = (host_node(params['src']) if params.get('src') else None, number('src_dpid'))
+            dst = (host_node(params['dst']) if params.get('dst') else None, number('dst_dpid'))
+            since = number('since')
+            limit = number('limit')
+            if limit is not None and limit <= 0:
+                raise ValueError('limit must be positive')
+            fmt = params.get('format', 'json')
+            if fmt not in ('json', 'compact'):
+                raise ValueError("format must be 'json' or 'compact'")
+            result = self.app.query_routes(src, dst, since, params.get('cursor') or None, limit, fmt == 'compact')
+        except StaleCursor as e:
+            return json_response(json.dumps({'error': str(e), 'generation': self.app.generation}), 409)
+        except ValueError as e:
+            return json_response(json.dumps({'error': str(e)}), 400)
+        return json_response(dumps(result))
@@ -1,5 +1,5 @@
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 import paramiko
 from fastapi.middleware.cors import CORSMiddleware
 import httpx
@@ -7,8 +7,16 @@ import socket
 from typing import Optional, Dict
 import logging
 import asyncio
+import json
+import functools
+import hashlib
+import shlex
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pydantic import BaseModel
 
+from metrics import CONTENT_TYPE, REGISTRY, Counter, Gauge, Histogram
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -48,41 +56,367 @@ class ServiceStatus(BaseModel):
     mininet: bool
     ryu_app: Optional[str]
     mininet_topology: Optional[str]
+    # Resultado de la última petición a Ryu (None: aún no se ha hablado con él)
+    ryu_reachable: Optional[bool] = None
 
 # Configuración de timeouts
 SSH_TIMEOUT = 10
 HTTP_TIMEOUT = 5
 
+# Sesiones SSH: hilos para las llamadas bloqueantes de paramiko y keep-alive (s)
+SSH_MAX_WORKERS = 4
+SSH_KEEPALIVE = 30
+
+# Arranque por sondeo: puerto OpenFlow, plazo total (s) y backoff de los sondeos (s)
+OPENFLOW_PORT = 6633
+STARTUP_DEADLINE = 60
+PROBE_INITIAL_DELAY = 0.1
+PROBE_MAX_DELAY = 2.0
+
+# Script de topología: fichero con su PID en el host de Mininet y espera (s) a
+# que termine su net.stop() al detenerlo
+MININET_PIDFILE = "mininet.pid"
+MININET_STOP_WAIT = 10
+
+# Canal de eventos: long-poll hacia Ryu (s, por debajo del máximo de Ryu),
+# keep-alive hacia los navegadores (s) y eventos pendientes por navegador
+EVENT_POLL_TIMEOUT = 25
+EVENT_HEARTBEAT = 15
+EVENT_QUEUE_SIZE = 64
+# Sin /routing/events en Ryu: cada cuánto se consulta /routing/status en su lugar (s)
+EVENT_FALLBACK_INTERVAL = 10
+
+# Entradas de flujo enviadas a Ryu a la vez por /stats/flowentry/bulk
+BULK_CONCURRENCY = 16
+
+# Vida (s) de las respuestas de /v1.0/topology/* en la caché del proxy
+TOPOLOGY_CACHE_TTL = 2.0
+
+# Pool de conexiones hacia Ryu (keep-alive HTTP/1.1)
+RYU_MAX_CONNECTIONS = 20
+RYU_MAX_KEEPALIVE = 10
+RYU_KEEPALIVE_EXPIRY = 30
+
+# Métricas expuestas en /metrics
+REQUEST_SECONDS = Histogram("servidor_request_seconds", "Duración de cada endpoint (hasta las cabeceras)",
+                            ("route", "method"))
+REQUESTS = Counter("servidor_requests_total", "Peticiones atendidas por endpoint y código", ("route", "method", "status"))
+RYU_SECONDS = Histogram("servidor_ryu_upstream_seconds", "Latencia de las peticiones a Ryu por ruta", ("method", "path"))
+RYU_ERRORS = Counter("servidor_ryu_upstream_errors_total",
+                     "Peticiones a Ryu fallidas por ruta: inalcanzable, timeout, transport o http_4xx/5xx",
+                     ("method", "path", "kind"))
+TOPOLOGY_CACHE_EVENTS = Counter("servidor_topology_cache_total", "Resultados de la caché de topología", ("result",))
+EVENT_SUBSCRIBERS = Gauge("servidor_event_subscribers", "Navegadores conectados a /events")
+
+# Cliente HTTP compartido; se crea al arrancar FastAPI y se cierra al apagarlo
+ryu_client: Optional[httpx.AsyncClient] = None
+ryu_reachable: Optional[bool] = None
+
+
+@app.on_event("startup")
+async def open_ryu_client():
+    """Crea el cliente HTTP compartido con pool de conexiones hacia Ryu"""
+    global ryu_client
+    ryu_client = httpx.AsyncClient(
+        base_url=RYU_BASE_URL,
+        timeout=httpx.Timeout(HTTP_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=RYU_MAX_CONNECTIONS,
+            max_keepalive_connections=RYU_MAX_KEEPALIVE,
+            keepalive_expiry=RYU_KEEPALIVE_EXPIRY,
+        ),
+        headers={"Connection": "keep-alive"},
+    )
+
+
+@app.on_event("shutdown")
+async def close_ryu_client():
+    """Cierra las conexiones del pool hacia Ryu"""
+    if ryu_client is not None:
+        await ryu_client.aclose()
+
+
+def _set_ryu_reachable(reachable: bool):
+    global ryu_reachable
+    if reachable != ryu_reachable:
+        logger.info(f"Ryu {'alcanzable' if reachable else 'inalcanzable'} en {RYU_BASE_URL}")
+    ryu_reachable = reachable
+
+
+async def ryu_request(method: str, path: str, stream: bool = False, **kwargs) -> httpx.Response:
+    """Envía una petición a Ryu por el pool compartido.
+
+    La disponibilidad se deduce del propio resultado: si no se puede abrir o
+    reutilizar una conexión se responde 503, sin un sondeo TCP previo.
+    Con ``stream`` el cuerpo queda sin leer; quien llama lo consume y cierra
+    la respuesta.
+    """
+    start = time.perf_counter()
+    try:
+        if stream:
+            response = await ryu_client.send(ryu_client.build_request(method, path, **kwargs), stream=True)
+        else:
+            response = await ryu_client.request(method, path, **kwargs)
+    except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+        RYU_ERRORS.inc(method, path, "unreachable")
+        _set_ryu_reachable(False)
+        raise HTTPException(
+            status_code=503,
+            detail=f"No se puede conectar al servidor Ryu en {RYU_SERVER_IP}:{RYU_SERVER_PORT}: {e}"
+        )
+    except httpx.TimeoutException:
+        RYU_ERRORS.inc(method, path, "timeout")
+        raise
+    except httpx.TransportError:
+        RYU_ERRORS.inc(method, path, "transport")
+        raise
+    finally:
+        RYU_SECONDS.observe(time.perf_counter() - start, method, path)
+    _set_ryu_reachable(True)
+    if response.status_code >= 400:
+        RYU_ERRORS.inc(method, path, f"http_{response.status_code // 100}xx")
+    return response
+
+class TopologyCache:
+    """Caché con TTL y single-flight para los GET de topología hacia Ryu.
+
+    Las peticiones concurrentes a la misma ruta comparten una única llamada a
+    Ryu y la respuesta se guarda unos segundos con un ETag, que el navegador
+    revalida con If-None-Match.
+    """
+
+    def __init__(self, ttl: float = TOPOLOGY_CACHE_TTL):
+        self.ttl = ttl
+        self._entries: Dict[str, tuple] = {}  # ruta -> (caduca, etag, cuerpo)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "not_modified": 0}
+
+    def clear(self):
+        self._entries.clear()
+
+    async def get(self, path: str) -> tuple:
+        """Devuelve (etag, cuerpo) de ``path``, desde la caché o desde Ryu"""
+        entry = self._entries.get(path)
+        if entry is not None and entry[0] > asyncio.get_running_loop().time():
+            self.stats["hits"] += 1
+            return entry[1], entry[2]
+        task = self._inflight.get(path)
+        if task is None:
+            self.stats["misses"] += 1
+            # Tarea propia: si el primer cliente se desconecta, los demás siguen esperando el resultado
+            task = self._inflight[path] = asyncio.ensure_future(self._fetch(path))
+            task.add_done_callback(functools.partial(self._fetched, path))
+        else:
+            self.stats["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    async def _fetch(self, path: str) -> tuple:
+        response = await ryu_request("GET", path)
+        response.raise_for_status()
+        body = response.content
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        self._entries[path] = (asyncio.get_running_loop().time() + self.ttl, etag, body)
+        return etag, body
+
+    def _fetched(self, path: str, task: asyncio.Future):
+        self._inflight.pop(path, None)
+        if not task.cancelled():
+            task.exception()  # ya entregada a quien esperaba; evita el aviso de excepción no leída
+
+    def response(self, request: Request, etag: str, body: bytes) -> Response:
+        """Respuesta 304 si el navegador ya tiene esta versión, o el cuerpo con su ETag"""
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag in request.headers.get("if-none-match", ""):
+            self.stats["not_modified"] += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+
+topology_cache = TopologyCache()
+
+
 async def check_host_availability(host: str, port: int, timeout: int = 5) -> bool:
     """Verifica si un host está disponible"""
     try:
-        _, writer = await asyncio.open_connection(host, port)
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
         writer.close()
         await writer.wait_closed()
         return True
     except (OSError, asyncio.TimeoutError):
         return False
 
-async def ssh_connect(host: str, username: str, password: str) -> paramiko.SSHClient:
-    """Establece una conexión SSH"""
-    ssh = paramiko.SSHClient()
-    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    try:
-        ssh.connect(
-            hostname=host,
-            username=username,
-            password=password,
-            timeout=10
-        )
+class SSHSessionPool:
+    """Sesiones SSH reutilizables, una por host.
+
+    paramiko es bloqueante, así que las conexiones y los exec_command se
+    ejecutan en un pool de hilos acotado y nunca en el bucle de eventos.
+    Cada sesión mantiene keep-alive y se valida antes de reutilizarla.
+    """
+
+    def __init__(self, max_workers: int = SSH_MAX_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ssh")
+        self._sessions: Dict[str, paramiko.SSHClient] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def _run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    @staticmethod
+    def _alive(ssh: paramiko.SSHClient) -> bool:
+        transport = ssh.get_transport()
+        return transport is not None and transport.is_active() and transport.is_authenticated()
+
+    @staticmethod
+    def _connect(host: str, username: str, password: str) -> paramiko.SSHClient:
+        ssh = paramiko.SSHClient()
+        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        ssh.connect(hostname=host, username=username, password=password, timeout=SSH_TIMEOUT)
+        ssh.get_transport().set_keepalive(SSH_KEEPALIVE)
         return ssh
-    except Exception as e:
-        logger.error(f"Error connecting to {host}: {str(e)}")
-        raise HTTPException(status_code=503, detail=f"No se puede conectar a {host}: {str(e)}")
+
+    async def get(self, host: str, username: str, password: str) -> paramiko.SSHClient:
+        """Devuelve una sesión autenticada con el host, reconectando si hace falta"""
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            ssh = self._sessions.get(host)
+            if ssh is not None and self._alive(ssh):
+                return ssh
+            if ssh is not None:
+                logger.info(f"Sesión SSH con {host} caída, reconectando")
+                ssh.close()
+                del self._sessions[host]
+            try:
+                ssh = await self._run(self._connect, host, username, password)
+            except Exception as e:
+                logger.error(f"Error connecting to {host}: {str(e)}")
+                raise HTTPException(status_code=503, detail=f"No se puede conectar a {host}: {str(e)}")
+            self._sessions[host] = ssh
+            return ssh
+
+    def _discard(self, host: str, ssh: paramiko.SSHClient):
+        if self._sessions.get(host) is ssh:
+            del self._sessions[host]
+        ssh.close()
+
+    @staticmethod
+    def _exec(ssh: paramiko.SSHClient, command: str, wait: bool, get_pty: bool):
+        stdin, stdout, stderr = ssh.exec_command(command, get_pty=get_pty)
+        if not wait:
+            return None
+        output = stdout.read().decode(errors="replace")
+        return stdout.channel.recv_exit_status(), output
+
+    async def exec(self, host: str, username: str, password: str, command: str,
+                   wait: bool = False, get_pty: bool = False):
+        """Ejecuta un comando en el host.
+
+        Con ``wait`` espera a que termine y devuelve (código de salida, stdout);
+        si no, vuelve en cuanto el canal está abierto. Si la sesión reutilizada
+        resulta estar muerta se reintenta una vez con una sesión nueva.
+        """
+        for attempt in range(2):
+            ssh = await self.get(host, username, password)
+            try:
+                return await self._run(self._exec, ssh, command, wait, get_pty)
+            except (paramiko.SSHException, EOFError, OSError) as e:
+                self._discard(host, ssh)
+                if attempt:
+                    raise HTTPException(status_code=503, detail=f"Error ejecutando comando en {host}: {str(e)}")
+                logger.warning(f"Sesión SSH con {host} inválida ({e}), reintentando")
+
+    def close(self):
+        for ssh in self._sessions.values():
+            ssh.close()
+        self._sessions.clear()
+        self._executor.shutdown(wait=False)
+
+
+ssh_pool = SSHSessionPool()
+
+
+@app.on_event("shutdown")
+async def close_ssh_pool():
+    """Cierra las sesiones SSH abiertas"""
+    ssh_pool.close()
+
+async def wait_until(check, deadline: float, phase: str):
+    """Sondea ``check`` con backoff exponencial hasta que sea cierto o venza ``deadline``"""
+    loop = asyncio.get_running_loop()
+    delay = PROBE_INITIAL_DELAY
+    while not await check():
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            raise HTTPException(status_code=504, detail=f"Tiempo de espera agotado en la fase '{phase}'")
+        await asyncio.sleep(min(delay, remaining))
+        delay = min(delay * 2, PROBE_MAX_DELAY)
+
+
+async def ryu_stopped() -> bool:
+    """Cierto cuando no queda ningún proceso ryu-manager en el servidor Ryu"""
+    # El patrón [r]yu evita que pgrep encuentre la propia shell que lo ejecuta
+    status, _ = await ssh_pool.exec(RYU_SERVER_IP, RYU_USER, RYU_PASS, "pgrep -f '[r]yu-manager'", wait=True)
+    return status == 1
+
+
+# Rutas que listan los switches conectados: la de ryu_routing_app.py y la de rest_topology.py
+SWITCH_LIST_PATHS = ("/routing/switches", "/v1.0/topology/switches")
+
+# Aplicaciones de start_all que abren la API REST (RYU_SERVER_PORT); el resto,
+# como simple_switch_13.py, solo escucha OpenFlow y no se puede sondear por HTTP
+REST_APPS = {"topologia", "ryu_routing_app.py"}
+
+
+def serves_rest(app_name: Optional[str]) -> bool:
+    """Si la aplicación de Ryu lanzada sirve la API REST"""
+    return app_name in REST_APPS
+
+
+async def ryu_switch_count() -> int:
+    """Número de switches que reporta la aplicación de Ryu lanzada, o -1 si aún no responde.
+
+    Cada aplicación sirve su propia ruta; un 404 pasa a la siguiente.
+    """
+    for path in SWITCH_LIST_PATHS:
+        try:
+            response = await ryu_request("GET", path)
+            if response.status_code == 404:
+                continue
+            response.raise_for_status()
+            return len(response.json())
+        except (HTTPException, httpx.HTTPError, ValueError):
+            return -1
+    return -1
+
+
+def topology_switch_count(spec: Optional[str]) -> Optional[int]:
+    """Switches que creará mininet_nsfnnet.py con la especificación ``--topo``.
+
+    None si no se puede saber de antemano (p. ej. 'file', que lee un fichero
+    del servidor Mininet) o si la especificación no es válida.
+    """
+    name, *params = (spec or "nsfnet").split(",")
+    args = [p for p in params if "=" not in p]
+    kwargs = dict(p.split("=", 1) for p in params if "=" in p)
+    try:
+        if name == "nsfnet":
+            return 14
+        if name == "fattree":
+            k = int(args[0] if args else kwargs.get("k", 4))
+            return 5 * k * k // 4  # (k/2)^2 de núcleo más k^2/2 de agregación y k^2/2 de acceso
+        if name == "torus":
+            rows = int(args[0] if args else kwargs.get("rows", 4))
+            cols = int(args[1] if len(args) > 1 else kwargs.get("cols", 4))
+            return rows * cols
+    except ValueError:
+        pass
+    return None
+
 
 @app.get("/status")
 async def get_status() -> ServiceStatus:
-    """Obtiene el estado actual de los servicios"""
-    return ServiceStatus(**service_status)
+    """Obtiene el estado actual de los servicios y si Ryu respondió la última vez"""
+    return ServiceStatus(**service_status, ryu_reachable=ryu_reachable)
 
 # Variable para almacenar el proceso de Ryu
 ryu_process = None
@@ -90,12 +424,33 @@ ryu_process = None
 class StartAppRequest(BaseModel):
     app_name: str
     topology_file: Optional[str] = "nsfnet.py"
+    # Especificación --topo de mininet_nsfnnet.py, p. ej. "fattree,k=8" (None: la del script)
+    topology: Optional[str] = None
+    # Switches que debe reportar Ryu para dar la topología por lista, solo con
+    # aplicaciones de REST_APPS (None: los que crea ``topology``, o al menos uno)
+    expected_switches: Optional[int] = None
 
 @app.post("/start-all")
 async def start_all(request: StartAppRequest):
-    """Inicia tanto Ryu como Mininet con la configuración especificada"""
+    """Inicia tanto Ryu como Mininet con la configuración especificada.
+
+    Cada fase espera a que el paso anterior esté realmente listo (sondeos con
+    backoff exponencial y un plazo total) y la respuesta incluye su duración.
+    Las aplicaciones sin API REST solo se esperan en el puerto OpenFlow.
+    """
     global service_status
-    
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline = started + STARTUP_DEADLINE
+    timings: Dict[str, float] = {}
+    mark = started
+
+    def phase_done(name: str):
+        nonlocal mark
+        now = loop.time()
+        timings[name] = round(now - mark, 3)
+        mark = now
+
     try:
         # Detener servicios existentes primero
         try:
@@ -103,57 +458,66 @@ async def start_all(request: StartAppRequest):
         except Exception as e:
             logger.warning(f"Error al detener servicios existentes: {str(e)}")
 
-        # Verificar conexión a ambos servidores
-        ryu_available = await check_host_availability(RYU_SERVER_IP, 22)
-        mininet_available = await check_host_availability(MININET_SERVER_IP, 22)
-
-        if not ryu_available or not mininet_available:
-            raise HTTPException(
-                status_code=503,
-                detail="No se puede conectar a uno o ambos servidores"
-            )
+        # Verificar conexión a ambos servidores (las sesiones quedan en el pool)
+        await asyncio.gather(
+            ssh_pool.get(RYU_SERVER_IP, RYU_USER, RYU_PASS),
+            ssh_pool.get(MININET_SERVER_IP, MININET_USER, MININET_PASS),
+        )
 
         # 1. Iniciar Ryu primero
-        ssh_ryu = await ssh_connect(RYU_SERVER_IP, RYU_USER, RYU_PASS)
-        
         # Comando para iniciar Ryu
         if request.app_name == "topologia":
             ryu_command = "ryu-manager --verbose --observe-links /usr/lib/python3/dist-packages/ryu/app/simple_switch_13.py /usr/lib/python3/dist-packages/ryu/app/rest_topology.py"
         else:
             ryu_command = f"ryu-manager /home/ryoyeison/Proyecto_Final/{request.app_name}"
         
-        # Matar cualquier proceso ryu-manager existente
-        ssh_ryu.exec_command("pkill -f ryu-manager")
-        await asyncio.sleep(2)  # Esperar a que termine el proceso anterior
-        
-        # Iniciar Ryu en background
-        stdin, stdout, stderr = ssh_ryu.exec_command(
-            f"nohup {ryu_command} > ryu.log 2>&1 &"
-        )
-    
-        # Esperar un momento para que Ryu inicie
-        await asyncio.sleep(5)
+        # Matar cualquier proceso ryu-manager existente y esperar a que termine
+        await ssh_pool.exec(RYU_SERVER_IP, RYU_USER, RYU_PASS, "pkill -f '[r]yu-manager'", wait=True)
+        await wait_until(ryu_stopped, deadline, "detener Ryu")
+        phase_done("stop")
         
-        # 2. Iniciar Mininet
-        ssh_mininet = await ssh_connect(MININET_SERVER_IP, MININET_USER, MININET_PASS)
+        # Iniciar Ryu en background y esperar a que abra los puertos OpenFlow y REST
+        await ssh_pool.exec(RYU_SERVER_IP, RYU_USER, RYU_PASS, f"nohup {ryu_command} > ryu.log 2>&1 &")
+        await wait_until(lambda: check_host_availability(RYU_SERVER_IP, OPENFLOW_PORT, timeout=1),
+                         deadline, "puerto OpenFlow")
+        phase_done("ryu_openflow")
+        rest = serves_rest(request.app_name)
+        if rest:
+            await wait_until(lambda: check_host_availability(RYU_SERVER_IP, RYU_SERVER_PORT, timeout=1),
+                             deadline, "puerto REST")
+            phase_done("ryu_rest")
+        service_status.update({"ryu": True, "ryu_app": request.app_name})
+        event_hub.status_changed()
         
-        # Comando para iniciar Mininet
+        # 2. Iniciar Mininet y esperar a que todos los switches se conecten a Ryu
         mininet_command = f"sudo python3 {request.topology_file} {RYU_SERVER_IP}"
+        if request.topology:
+            mininet_command += f" --topo {shlex.quote(request.topology)}"
         
-        stdin, stdout, stderr = ssh_mininet.exec_command(
-            f"nohup {mininet_command} > mininet.log 2>&1 &"
-        )
-        
-        # Actualizar estado
+        await ssh_pool.exec(MININET_SERVER_IP, MININET_USER, MININET_PASS,
+                            f"nohup {mininet_command} > mininet.log 2>&1 & echo $! > {MININET_PIDFILE}")
+        # Mininet ya corre: marcado desde ahora, stop_all lo limpia aunque falle el sondeo
         service_status.update({
-            "ryu": True,
             "mininet": True,
-            "ryu_app": request.app_name,
-            "mininet_topology": request.topology_file
+            "mininet_topology": request.topology or request.topology_file
         })
+        event_hub.status_changed()
+        # Sin API REST no hay forma de contar los switches: basta con que Mininet esté lanzado
+        if rest:
+            expected = request.expected_switches or topology_switch_count(request.topology) or 1
+
+            async def topology_ready() -> bool:
+                return await ryu_switch_count() >= expected
+
+            await wait_until(topology_ready, deadline, f"topología ({expected} switches)")
+            phase_done("topology")
+        timings["total"] = round(loop.time() - started, 3)
+        logger.info(f"Servicios iniciados en {timings['total']} s: {timings}")
         
-        return {"message": "Servicios iniciados correctamente", "status": service_status}
+        return {"message": "Servicios iniciados correctamente", "status": service_status, "timings": timings}
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error al iniciar servicios: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error al iniciar servicios: {str(e)}")
@@ -163,20 +527,11 @@ async def start_ryu(request: Request):
     """Inicia solo el controlador Ryu"""
     global service_status
     try:
-        # Verificar si el servidor Ryu está accesible
-        if not await check_host_availability(RYU_SERVER_IP, 22):
-            raise HTTPException(
-                status_code=503,
-                detail=f"No se puede conectar al servidor Ryu en {RYU_SERVER_IP}"
-            )
-
         data = await request.json()
         app_name = data.get('app_name')
         
         logger.info(f"Iniciando aplicación Ryu: {app_name}")
         
-        ssh = await ssh_connect(RYU_SERVER_IP, RYU_USER, RYU_PASS)
-
         # Ejecutar el comando ryu-manager con el app 'simple_switch.py'
         #command = "ryu-manager /usr/lib/python3/dist-packages/ryu/app/simple_switch.py"
         if(app_name=="topologia"):
@@ -185,11 +540,12 @@ async def start_ryu(request: Request):
         else:
             command = f"ryu-manager /usr/lib/python3/dist-packages/ryu/app/{app_name}"
         
-        ryu_process = ssh.exec_command(command, get_pty=True)  # Ejecuta el comando y obtiene el canal
-        # Acceder al canal de stdin y stdout
-        stdin, stdout, stderr = ryu_process
+        # El canal queda abierto sobre la sesión del pool mientras Ryu corre
+        await ssh_pool.exec(RYU_SERVER_IP, RYU_USER, RYU_PASS, command, get_pty=True)
 
         return JSONResponse({"message": "Aplicación iniciada correctamente"})
+    except HTTPException as e:
+        return JSONResponse({"message": f"Error al iniciar la aplicación: {e.detail}"}, status_code=e.status_code)
     except Exception as e:
         return JSONResponse({"message": f"Error al iniciar la aplicación: {str(e)}"}, status_code=500)
 
@@ -198,18 +554,23 @@ async def stop_all():
     """Detiene tanto Ryu como Mininet"""
     global service_status
     try:
-        # Detener Mininet primero
+        # Mininet y Ryu están en hosts distintos: se detienen en paralelo
+        tasks = []
         if service_status["mininet"]:
-            ssh_mininet = await ssh_connect(MININET_SERVER_IP, MININET_USER, MININET_PASS)
-            ssh_mininet.exec_command("sudo mn -c")  # Limpia Mininet
-            ssh_mininet.exec_command("sudo pkill -f mininet")
-            ssh_mininet.close()
-            
-        # Detener Ryu
+            # El script de topología solo termina con una señal: se le envía SIGTERM por su
+            # PID (sudo la reenvía), se espera a su net.stop() y después se limpia lo que quede.
+            # Los patrones de pkill -f van entre corchetes para no coincidir con la shell que
+            # ejecuta el comando, y solo con python: "sshd: mininet@..." es la propia sesión
+            stop_script = (
+                f"pid=$(cat {MININET_PIDFILE} 2>/dev/null) && sudo kill $pid && "
+                f"timeout {MININET_STOP_WAIT} sh -c 'while [ -d /proc/'$pid' ]; do sleep 0.2; done'; "
+                f"rm -f {MININET_PIDFILE}"
+            )
+            tasks.append(ssh_pool.exec(MININET_SERVER_IP, MININET_USER, MININET_PASS,
+                                       f"{stop_script}; sudo mn -c; sudo pkill -f 'python.*[m]ininet'", wait=True))
         if service_status["ryu"]:
-            ssh_ryu = await ssh_connect(RYU_SERVER_IP, RYU_USER, RYU_PASS)
-            ssh_ryu.exec_command("pkill -f ryu-manager")
-            ssh_ryu.close()
+            tasks.append(ssh_pool.exec(RYU_SERVER_IP, RYU_USER, RYU_PASS, "pkill -f '[r]yu-manager'", wait=True))
+        await asyncio.gather(*tasks)
             
         # Actualizar estado
         service_status.update({
@@ -218,6 +579,7 @@ async def stop_all():
             "ryu_app": None,
             "mininet_topology": None
         })
+        event_hub.status_changed()
         
         return {"message": "Servicios detenidos correctamente", "status": service_status}
         
@@ -231,12 +593,11 @@ async def stop_ryu():
     global service_status
     try:
         if service_status["ryu"]:
-            ssh = await ssh_connect(RYU_SERVER_IP, RYU_USER, RYU_PASS)
-            ssh.exec_command("pkill -f ryu-manager")
-            ssh.close()
+            await ssh_pool.exec(RYU_SERVER_IP, RYU_USER, RYU_PASS, "pkill -f '[r]yu-manager'")
             
             service_status["ryu"] = False
             service_status["ryu_app"] = None
+            event_hub.status_changed()
             
             return JSONResponse({"message": "Ryu detenido correctamente", "status": service_status})
         else:
@@ -246,7 +607,7 @@ async def stop_ryu():
         return JSONResponse({"message": f"Error al detener Ryu: {str(e)}"}, status_code=500)
 
 @app.get("/v1.0/topology/links")
-async def get_links():
+async def get_links(request: Request):
     """
     Método para obtener la lista de enlaces de la topología desde el controlador Ryu.
     """
@@ -257,20 +618,8 @@ async def get_links():
                 detail="El controlador Ryu no está en ejecución"
             )
 
-        # Verificar la disponibilidad del servidor Ryu
-        if not await check_host_availability(RYU_SERVER_IP, RYU_SERVER_PORT):
-            raise HTTPException(
-                status_code=503,
-                detail=f"No se puede conectar al servidor Ryu en {RYU_SERVER_IP}:{RYU_SERVER_PORT}"
-            )
-
-        url = f"{RYU_BASE_URL}/v1.0/topology/links"
-        timeout = httpx.Timeout(HTTP_TIMEOUT)
-
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            response = await client.get(url)
-            response.raise_for_status()
-            return response.json()
+        etag, body = await topology_cache.get("/v1.0/topology/links")
+        return topology_cache.response(request, etag, body)
 
     except httpx.RequestError as e:
         # Capturar errores de conexión o solicitud
@@ -283,7 +632,7 @@ async def get_links():
         ) 
 
 @app.get("/v1.0/topology/hosts")
-async def get_hosts():
+async def get_hosts(request: Request):
     """
     Método para obtener la lista de hosts de la topología desde el controlador Ryu.
     """
@@ -294,24 +643,9 @@ async def get_hosts():
                 detail="El controlador Ryu no está en ejecución"
             )
 
-        # Verificar la disponibilidad del servidor Ryu
-        if not await check_host_availability(RYU_SERVER_IP, RYU_SERVER_PORT):
-            raise HTTPException(
-                status_code=503,
-                detail=f"No se puede conectar al servidor Ryu en {RYU_SERVER_IP}:{RYU_SERVER_PORT}"
-            )
-
-        # URL del endpoint de hosts en Ryu
-        url = f"{RYU_BASE_URL}/v1.0/topology/hosts"
-
-        # Configurar timeout
-        timeout = httpx.Timeout(timeout=HTTP_TIMEOUT)
-
-        # Hacer una solicitud GET asincrónica al controlador Ryu
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            response = await client.get(url)
-            response.raise_for_status()  # Levanta una excepción si el código de estado no es 2xx
-            return response.json()  # Devolver la respuesta como JSON
+        # Solicitud GET al controlador Ryu, compartida con otras concurrentes y cacheada
+        etag, body = await topology_cache.get("/v1.0/topology/hosts")
+        return topology_cache.response(request, etag, body)
 
     except httpx.RequestError as e:
         # Capturar errores de conexión o solicitud
@@ -333,25 +667,23 @@ async def agregar_flujo(request: Request):
         # Obtener el JSON enviado por el cliente
         payload = await request.json()
 
-        # URL del endpoint en el servidor Ryu
-        url = f"{RYU_BASE_URL}/stats/flowentry/add"
-
         # Enviar la solicitud POST al controlador Ryu
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=payload)
-            response.raise_for_status()
+        response = await ryu_request("POST", "/stats/flowentry/add", json=payload)
+        response.raise_for_status()
 
-            # Intentar parsear la respuesta como JSON
-            try:
-                response_data = response.json()
-            except ValueError:
-                response_data = {"raw_response": response.text}
+        # Intentar parsear la respuesta como JSON
+        try:
+            response_data = response.json()
+        except ValueError:
+            response_data = {"raw_response": response.text}
 
-            return {
-                "message": "Solicitud procesada con éxito en Ryu",
-                "ryu_response": response_data,
-            }
+        return {
+            "message": "Solicitud procesada con éxito en Ryu",
+            "ryu_response": response_data,
+        }
 
+    except HTTPException:
+        raise
     except httpx.RequestError as e:
         # Capturar errores de conexión o solicitud
         raise HTTPException(status_code=500, detail=f"Error al conectar con el controlador Ryu: {e}")
@@ -366,21 +698,99 @@ async def agregar_flujo(request: Request):
         raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
 
 
+async def _add_flow_entry(index: int, entry: dict, semaphore: asyncio.Semaphore) -> dict:
+    """Envía una entrada a /stats/flowentry/add y devuelve su resultado"""
+    result = {"index": index, "dpid": entry.get("dpid"), "ok": False}
+    async with semaphore:
+        try:
+            response = await ryu_request("POST", "/stats/flowentry/add", json=entry)
+            result["status"] = response.status_code
+            result["ok"] = response.is_success
+            if not response.is_success:
+                result["error"] = response.text
+        except HTTPException as e:
+            result.update(status=e.status_code, error=e.detail)
+        except httpx.RequestError as e:
+            result.update(status=500, error=f"Error al conectar con el controlador Ryu: {e}")
+    return result
+
+
+async def _add_flow_group(dpid, items, semaphore: asyncio.Semaphore, barrier: bool) -> tuple:
+    """Envía las entradas de un dpid y, si se pide, las cierra con una barrera"""
+    results = await asyncio.gather(*[_add_flow_entry(i, entry, semaphore) for i, entry in items])
+    if not barrier:
+        return results, None
+    try:
+        response = await ryu_request("POST", "/routing/barrier", json={"dpids": [dpid]}, timeout=None)
+        response.raise_for_status()
+        report = response.json()
+        confirmed = {"complete": report["complete"] and not report["missing"],
+                     "elapsed_ms": report["elapsed_ms"]}
+    except (HTTPException, httpx.HTTPError, ValueError, KeyError) as e:
+        confirmed = {"complete": False, "error": str(getattr(e, "detail", e))}
+    return results, confirmed
+
+
+@app.post("/stats/flowentry/bulk")
+async def agregar_flujos(request: Request):
+    """
+    Método para agregar varias entradas de flujo en el controlador Ryu.
+
+    Espera JSON {"entries": [...], "barrier": false}, donde cada entrada es el
+    cuerpo de /stats/flowentry/add. Se envían por el pool con concurrencia
+    acotada y se devuelve un resultado por entrada, en el orden recibido. Con
+    "barrier", las entradas de cada dpid terminan con una barrera y
+    "barriers" indica si el switch confirmó que ya están instaladas.
+    """
+    if not service_status["ryu"]:
+        raise HTTPException(status_code=503, detail="El controlador Ryu no está en ejecución")
+    try:
+        payload = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="El cuerpo debe ser JSON")
+    if isinstance(payload, list):
+        payload = {"entries": payload}
+    entries = payload.get("entries") if isinstance(payload, dict) else None
+    if not isinstance(entries, list) or not all(isinstance(entry, dict) for entry in entries):
+        raise HTTPException(status_code=400, detail="Se esperaba {\"entries\": [ {...}, ... ]}")
+
+    # Agrupar por dpid para poder cerrar cada switch con su barrera
+    groups: Dict[object, list] = {}
+    for index, entry in enumerate(entries):
+        groups.setdefault(entry.get("dpid"), []).append((index, entry))
+
+    semaphore = asyncio.Semaphore(BULK_CONCURRENCY)
+    barrier = bool(payload.get("barrier"))
+    done = await asyncio.gather(*[_add_flow_group(dpid, items, semaphore, barrier and dpid is not None)
+                                  for dpid, items in groups.items()])
+
+    results = sorted((result for group, _ in done for result in group), key=lambda r: r["index"])
+    response = {
+        "message": "Solicitud procesada en Ryu",
+        "total": len(results),
+        "ok": sum(result["ok"] for result in results),
+        "results": results,
+    }
+    if barrier:
+        response["barriers"] = {str(dpid): confirmed for dpid, (_, confirmed) in zip(groups, done)
+                                if confirmed is not None}
+    return response
+
+
 @app.post("/routing/mode")
 async def set_routing_mode(request: Request):
     """Proxy endpoint to set routing mode on the Ryu routing app.
-    Expects JSON: { "mode": "dijkstra_bw" | "shortest_hops" }
+    Expects JSON: { "mode": "dijkstra_bw" | "shortest_hops" | "dijkstra_load" | "ecmp" }
     """
     try:
         payload = await request.json()
-        url = f"{RYU_BASE_URL}/routing/mode"
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=payload)
-            response.raise_for_status()
-            try:
-                return response.json()
-            except ValueError:
-                return {"raw": response.text}
+        # La instalación espera las barreras de los switches; puede tardar más que una consulta
+        response = await ryu_request("POST", "/routing/mode", json=payload, timeout=None)
+        response.raise_for_status()
+        try:
+            return response.json()
+        except ValueError:
+            return {"raw": response.text}
     except httpx.RequestError as e:
         raise HTTPException(status_code=500, detail=f"Error al conectar con Ryu: {e}")
     except httpx.HTTPStatusError as e:
@@ -388,8 +798,13 @@ async def set_routing_mode(request: Request):
 
 
 @app.get("/routing/status")
-async def get_routing_status():
-    """Proxy to Ryu routing status endpoint."""
+async def get_routing_status(request: Request):
+    """Proxy to Ryu routing status endpoint.
+
+    Los parámetros (src, dst, src_dpid, dst_dpid, since, limit, cursor, format)
+    pasan tal cual y el cuerpo se retransmite sin decodificarlo: con miles de
+    hosts son megabytes de JSON.
+    """
     try:
         if not service_status["ryu"]:
             raise HTTPException(
@@ -397,20 +812,26 @@ async def get_routing_status():
                 detail="El controlador Ryu no está en ejecución"
             )
 
-        # Verificar la disponibilidad del servidor Ryu
-        if not await check_host_availability(RYU_SERVER_IP, RYU_SERVER_PORT):
-            raise HTTPException(
-                status_code=503,
-                detail=f"No se puede conectar al servidor Ryu en {RYU_SERVER_IP}:{RYU_SERVER_PORT}"
-            )
-
-        url = f"{RYU_BASE_URL}/routing/status"
-        timeout = httpx.Timeout(timeout=HTTP_TIMEOUT)
-        
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            response = await client.get(url)
+        response = await ryu_request("GET", "/routing/status", stream=True,
+                                     params=request.query_params.multi_items())
+        if response.is_error:
+            await response.aread()
+            await response.aclose()
             response.raise_for_status()
-            return response.json()
+
+        async def body():
+            try:
+                async for chunk in response.aiter_raw():
+                    yield chunk
+            finally:
+                await response.aclose()
+
+        headers = {"Content-Encoding": response.headers["content-encoding"]} \
+            if "content-encoding" in response.headers else None
+        return StreamingResponse(body(), status_code=response.status_code, headers=headers,
+                                 media_type=response.headers.get("content-type", "application/json"))
+    except HTTPException:
+        raise
     except httpx.RequestError as e:
         logger.error(f"Error al conectar con Ryu: {e}")
         raise HTTPException(status_code=500, detail=f"Error al conectar con Ryu: {e}")
@@ -419,4 +840,284 @@ async def get_routing_status():
         raise HTTPException(status_code=e.response.status_code, detail=f"Error desde Ryu: {e.response.text}")
     except Exception as e:
         logger.error(f"Error inesperado: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error inesperado: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error inesperado: {str(e)}")
+
+
+async def _proxy_path_query(method: str, **kwargs) -> Response:
+    # Las respuestas de /routing/path pasan sin decodificar
+    if not service_status["ryu"]:
+        raise HTTPException(status_code=503, detail="El controlador Ryu no está en ejecución")
+    try:
+        response = await ryu_request(method, "/routing/path", **kwargs)
+        response.raise_for_status()
+    except httpx.RequestError as e:
+        raise HTTPException(status_code=500, detail=f"Error al conectar con Ryu: {e}")
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(status_code=e.response.status_code, detail=f"Error desde Ryu: {e.response.text}")
+    return Response(response.content, media_type=response.headers.get("content-type", "application/json"))
+
+
+@app.get("/routing/path")
+async def get_routing_path(src: str, dst: str):
+    """Ruta entre dos hosts (MAC, host-<mac> o IPv4): saltos, puertos, peso total y ancho de banda mínimo.
+
+    Ryu la responde desde el árbol de caminos mínimos en caché, sin calcular el resto de pares.
+    """
+    return await _proxy_path_query("GET", params={"src": src, "dst": dst})
+
+
+@app.post("/routing/path")
+async def get_routing_paths(request: Request):
+    """Varias rutas en una sola petición: { "pairs": [[src, dst], ...] }.
+
+    Los pares que fallan llevan un campo "error" en lugar de la ruta.
+    """
+    return await _proxy_path_query("POST", content=await request.body(),
+                                   headers={"Content-Type": "application/json"}, timeout=None)
+
+class EventHub:
+    """Reparte a los navegadores los cambios de Ryu y del estado de los servicios.
+
+    Una sola tarea hace long-poll a /routing/events mientras haya suscriptores
+    y mantiene el estado completo aplicando los deltas. Cada navegador nuevo
+    recibe primero una instantánea y después solo deltas, así que la carga en
+    Ryu no crece con el número de paneles abiertos ni cuesta nada en reposo.
+    Si la aplicación de Ryu no ofrece /routing/events (404 u otro error no
+    recuperable) se pasa a consultar /routing/status cada
+    EVENT_FALLBACK_INTERVAL y se envían instantáneas cuando algo cambia.
+    """
+
+    def __init__(self):
+        self.subscribers = set()
+        self.generation = -1
+        self.mode: Optional[str] = None
+        self.routes: Dict[str, list] = {}
+        self.polling = False
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._pump())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def snapshot(self) -> dict:
+        return {"generation": self.generation, "mode": self.mode, "routes": self.routes,
+                "status": dict(service_status)}
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=EVENT_QUEUE_SIZE)
+        queue.put_nowait(("snapshot", self.snapshot()))
+        self.subscribers.add(queue)
+        self._wakeup.set()
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+
+    def publish(self, kind: str, data: dict):
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait((kind, data))
+            except asyncio.QueueFull:
+                # Navegador demasiado lento: se le desconecta y al reconectar recibe una instantánea
+                self.subscribers.discard(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+
+    def status_changed(self):
+        """Notifica un cambio en service_status y reanuda o pausa el long-poll"""
+        if not service_status["ryu"]:
+            # Un Ryu nuevo empieza de cero: la próxima consulta pide el estado completo
+            self.generation = -1
+            self.routes = {}
+            # La próxima aplicación puede ofrecer /routing/events: volver a probarlo
+            self.polling = False
+        topology_cache.clear()
+        self.publish("status", dict(service_status))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _apply(self, result: dict):
+        if result["generation"] < self.generation:
+            # Ryu se reinició por su cuenta: volver a pedir todo
+            self.generation = -1
+            return
+        if result["generation"] == self.generation:
+            return
+        if result["truncated"] or any(change["type"] not in ("mode", "load") for change in result["changes"]):
+            topology_cache.clear()
+        if result["full"]:
+            self.routes = dict(result["routes"])
+        else:
+            self.routes.update(result["routes"])
+            for key in result["removed"]:
+                self.routes.pop(key, None)
+        self.generation = result["generation"]
+        self.mode = result["mode"]
+        self.publish("delta", result)
+
+    async def _sleep(self, seconds: float):
+        """Espera ``seconds`` o hasta el próximo status_changed"""
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _poll_status(self):
+        """Sustituye al long-poll cuando Ryu no ofrece /routing/events"""
+        response = await ryu_request("GET", "/routing/status")
+        response.raise_for_status()
+        result = response.json()
+        if result["mode"] != self.mode or result["routes"] != self.routes:
+            self.mode = result["mode"]
+            self.routes = result["routes"]
+            topology_cache.clear()
+            self.publish("snapshot", self.snapshot())
+
+    async def _pump(self):
+        delay = PROBE_INITIAL_DELAY
+        while True:
+            if not self.subscribers or not service_status["ryu"] or not serves_rest(service_status["ryu_app"]):
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            if self.polling:
+                try:
+                    await self._poll_status()
+                except (HTTPException, httpx.HTTPError, ValueError, KeyError) as e:
+                    logger.warning(f"Error consultando el estado de Ryu: {e}")
+                await self._sleep(EVENT_FALLBACK_INTERVAL)
+                continue
+            try:
+                response = await ryu_request(
+                    "GET", "/routing/events",
+                    params={"since": self.generation, "timeout": EVENT_POLL_TIMEOUT},
+                    timeout=httpx.Timeout(HTTP_TIMEOUT, read=EVENT_POLL_TIMEOUT + HTTP_TIMEOUT),
+                )
+                if response.is_client_error and response.status_code not in (408, 429) \
+                        or response.status_code == 501:
+                    # Reintentar no arregla un 404: la aplicación no tiene canal de eventos
+                    logger.warning(f"Ryu respondió {response.status_code} en /routing/events; "
+                                   f"se consulta /routing/status cada {EVENT_FALLBACK_INTERVAL} s")
+                    self.polling = True
+                    self.generation = -1
+                    delay = PROBE_INITIAL_DELAY
+                    continue
+                response.raise_for_status()
+                self._apply(response.json())
+                delay = PROBE_INITIAL_DELAY
+            except (HTTPException, httpx.HTTPError, ValueError) as e:
+                logger.warning(f"Error leyendo eventos de Ryu: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, PROBE_MAX_DELAY)
+
+
+event_hub = EventHub()
+
+
+@app.on_event("startup")
+async def start_event_hub():
+    event_hub.start()
+
+
+@app.on_event("shutdown")
+async def stop_event_hub():
+    await event_hub.stop()
+
+
+@app.get("/events")
+async def stream_events():
+    """Canal Server-Sent Events con los cambios de topología, rutas y servicios.
+
+    Envía un evento ``snapshot`` al conectar y luego ``delta`` (rutas y
+    cambios de topología de Ryu) y ``status`` (servicios iniciados/detenidos).
+    """
+    queue = event_hub.subscribe()
+
+    async def stream():
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), EVENT_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if item is None:
+                    return
+                kind, data = item
+                yield f"event: {kind}\ndata: {json.dumps(data)}\n\n"
+        finally:
+            event_hub.unsubscribe(queue)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """Contadores de la caché de topología (aciertos, fallos, peticiones agrupadas, 304)"""
+    return dict(topology_cache.stats, ttl=topology_cache.ttl)
+
+
+class RequestMetricsMiddleware:
+    """Mide cada petición por plantilla de ruta, hasta que salen las cabeceras.
+
+    Middleware ASGI puro: no envuelve el cuerpo, así que /events sigue
+    transmitiéndose tal cual. Las rutas desconocidas se agrupan en una serie.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.paths: Dict[object, str] = {}  # endpoint -> plantilla de ruta
+
+    def _route(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is not None and endpoint not in self.paths:
+            self.paths.update({r.endpoint: r.path for r in scope["app"].routes if hasattr(r, "endpoint")})
+        return self.paths.get(endpoint, "<unmatched>")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        recorded = False
+
+        def record(status):
+            nonlocal recorded
+            recorded = True
+            route = self._route(scope)
+            REQUEST_SECONDS.observe(time.perf_counter() - start, route, scope["method"])
+            REQUESTS.inc(route, scope["method"], str(status))
+
+        async def send_and_record(message):
+            if message["type"] == "http.response.start":
+                record(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_record)
+        finally:
+            if not recorded:
+                record(500)
+
+
+app.add_middleware(RequestMetricsMiddleware)
+
+
+TOPOLOGY_CACHE_EVENTS.set_function(lambda: {(name,): count for name, count in topology_cache.stats.items()})
+EVENT_SUBSCRIBERS.set_function(lambda: len(event_hub.subscribers))
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Métricas en formato de texto de Prometheus"""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,271 @@
+"""Reactive path setup in ryu_routing_app, driven with a fake datapath.
+
+Each test feeds packet-ins straight into RoutingApp and checks the exact
+FlowMod / PacketOut / barrier sequence the switches would receive.
+"""
+import struct
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('ryu')
+
+from ryu.app.wsgi import WSGIApplication  # noqa: E402
+from ryu.controller import ofp_event  # noqa: E402
+from ryu.lib.packet import arp, ether_types, ethernet, packet  # noqa: E402
+from ryu.ofproto import ofproto_parser, ofproto_v1_3 as ofp, ofproto_v1_3_parser as parser  # noqa: E402
+from ryu.topology import event  # noqa: E402
+from ryu.topology.switches import Host, Link, Port, Switch  # noqa: E402
+
+import ryu_routing_app as rra  # noqa: E402
+
+H1 = '00:00:00:00:00:01'
+H3 = '00:00:00:00:00:03'
+BROADCAST = 'ff:ff:ff:ff:ff:ff'
+# A 1 - 2 - 3 line: (dpid, port, peer dpid, peer port). Every switch has ports
+# 1-3; those not in a link are edge ports, so sw1 {1, 3}, sw2 {1}, sw3 {1, 3}
+LINKS = [(1, 2, 2, 2), (2, 3, 3, 2)]
+
+
+class FakeDatapath(object):
+    """Stands in for a switch connection: decodes every message the app sends.
+
+    All datapaths append to one shared log, so the order across switches is
+    kept too.
+    """
+
+    def __init__(self, dpid, log):
+        self.id = dpid
+        self.ofproto = ofp
+        self.ofproto_parser = parser
+        self.log = log
+        self.xid = 0
+
+    def set_xid(self, msg):
+        self.xid += 1
+        msg.set_xid(self.xid)
+        return self.xid
+
+    def send_msg(self, msg):
+        if msg.xid is None:
+            self.set_xid(msg)
+        msg.serialize()
+        return self.send(msg.buf)
+
+    def send(self, buf):
+        offset = 0
+        while offset < len(buf):
+            _version, msg_type, length, xid = ofproto_parser.header(buf[offset:])
+            self.log.append(decode(self, msg_type, xid, bytes(buf[offset:offset + length])))
+            offset += length
+        return True
+
+
+def decode(dp, msg_type, xid, buf):
+    if msg_type == ofp.OFPT_FLOW_MOD:
+        msg = ofproto_parser.msg(dp, ofp.OFP_VERSION, msg_type, len(buf), xid, buf)
+        return SimpleNamespace(kind='flow_mod', dpid=dp.id, xid=xid, command=msg.command, cookie=msg.cookie,
+                               priority=msg.priority, idle_timeout=msg.idle_timeout, match=msg.match,
+                               actions=[action for inst in msg.instructions for action in inst.actions])
+    if msg_type == ofp.OFPT_PACKET_OUT:
+        buffer_id, in_port, actions_len = struct.unpack_from('!IIH', buf, ofp.OFP_HEADER_SIZE)
+        offset = ofp.OFP_PACKET_OUT_SIZE
+        actions = []
+        while offset < ofp.OFP_PACKET_OUT_SIZE + actions_len:
+            action = parser.OFPAction.parser(buf, offset)
+            actions.append(action)
+            offset += action.len
+        return SimpleNamespace(kind='packet_out', dpid=dp.id, xid=xid, buffer_id=buffer_id, in_port=in_port,
+                               ports=[action.port for action in actions], data=buf[offset:])
+    if msg_type == ofp.OFPT_GROUP_MOD:
+        command, group_type, group_id = struct.unpack_from('!HBxI', buf, ofp.OFP_HEADER_SIZE)
+        return SimpleNamespace(kind='group_mod', dpid=dp.id, xid=xid, command=command, group_id=group_id)
+    assert msg_type == ofp.OFPT_BARRIER_REQUEST, msg_type
+    return SimpleNamespace(kind='barrier', dpid=dp.id, xid=xid)
+
+
+def port(dpid, port_no):
+    return parser.OFPPort(port_no, '00:00:00:00:%02x:%02x' % (dpid, port_no), b'p%d' % port_no,
+                          0, 0, 0, 0, 0, 0, 0, 0)
+
+
+def arp_frame(src, dst, opcode, src_ip, dst_ip):
+    pkt = packet.Packet()
+    pkt.add_protocol(ethernet.ethernet(dst, src, ether_types.ETH_TYPE_ARP))
+    target = '00:00:00:00:00:00' if dst == BROADCAST else dst
+    pkt.add_protocol(arp.arp(opcode=opcode, src_mac=src, src_ip=src_ip, dst_mac=target, dst_ip=dst_ip))
+    pkt.serialize()
+    return bytes(pkt.data)
+
+
+def packet_in(net, dpid, in_port, data, buffer_id=ofp.OFP_NO_BUFFER, total_len=None, cookie=rra.FLOW_COOKIE):
+    dp = net.dps[dpid]
+    msg = parser.OFPPacketIn(dp, buffer_id, total_len or len(data), ofp.OFPR_NO_MATCH, 0, cookie,
+                             parser.OFPMatch(in_port=in_port), data)
+    net.app.packet_in_handler(ofp_event.EventOFPPacketIn(msg))
+
+
+def reply_barriers(net, dpid):
+    for msg in [msg for msg in net.log if msg.kind == 'barrier' and msg.dpid == dpid]:
+        reply = parser.OFPBarrierReply(net.dps[dpid])
+        reply.xid = msg.xid
+        net.app.barrier_reply_handler(ofp_event.EventOFPBarrierReply(reply))
+
+
+def kinds(log):
+    return [(msg.dpid, msg.kind) for msg in log]
+
+
+@pytest.fixture
+def net():
+    """The line topology with H3 known on sw3 port 1; the log starts empty."""
+    log = []
+    app = rra.RoutingApp(wsgi=WSGIApplication())
+    app.reactive = True
+    dps = {}
+    for dpid in (1, 2, 3):
+        dp = dps[dpid] = FakeDatapath(dpid, log)
+        switch = Switch(dp)
+        for port_no in (1, 2, 3):
+            switch.add_port(port(dpid, port_no))
+        app.switch_enter_handler(event.EventSwitchEnter(switch))
+    enter = list(log)
+    for a, port_a, b, port_b in LINKS:
+        ends = (Port(a, ofp, port(a, port_a)), Port(b, ofp, port(b, port_b)))
+        for src, dst in (ends, ends[::-1]):
+            app.link_add_handler(event.EventLinkAdd(Link(src, dst)))
+    host = Host(H3, Port(3, ofp, port(3, 1)))
+    host.ipv4 = ['10.0.0.3']
+    app.host_add_handler(event.EventHostAdd(host))
+    del log[:]
+    return SimpleNamespace(app=app, dps=dps, log=log, enter=enter)
+
+
+def test_switch_enter_installs_table_miss(net):
+    misses = [msg for msg in net.enter if msg.kind == 'flow_mod' and msg.priority == 0]
+    assert [msg.dpid for msg in misses] == [1, 2, 3]
+    for msg in misses:
+        assert msg.command == ofp.OFPFC_ADD
+        assert msg.cookie == rra.FLOW_COOKIE
+        assert [(action.port, action.max_len) for action in msg.actions] == \
+            [(ofp.OFPP_CONTROLLER, rra.MISS_SEND_LEN)]
+
+
+def test_miss_installs_path_egress_first_and_releases_unbuffered_packet(net):
+    data = arp_frame(H1, H3, arp.ARP_REPLY, '10.0.0.1', '10.0.0.3')
+    packet_in(net, 1, 1, data)
+
+    # One batch per switch, egress first; the ingress batch carries the packet-out before its barrier
+    assert kinds(net.log) == [
+        (3, 'flow_mod'), (3, 'flow_mod'), (3, 'barrier'),
+        (2, 'flow_mod'), (2, 'flow_mod'), (2, 'barrier'),
+        (1, 'flow_mod'), (1, 'flow_mod'), (1, 'packet_out'), (1, 'barrier'),
+    ]
+    rules = {(msg.dpid, msg.match['eth_dst']): [action.port for action in msg.actions]
+             for msg in net.log if msg.kind == 'flow_mod'}
+    # Towards H3 and, since the sender sits on the ingress switch, back to H1
+    assert rules == {(3, H3): [1], (2, H3): [3], (1, H3): [2],
+                     (3, H1): [2], (2, H1): [2], (1, H1): [1]}
+    for msg in net.log:
+        if msg.kind == 'flow_mod':
+            assert (msg.command, msg.cookie, msg.priority, msg.idle_timeout) == \
+                (ofp.OFPFC_ADD, rra.REACTIVE_COOKIE, rra.REACTIVE_PRIORITY, rra.REACTIVE_IDLE_TIMEOUT)
+    out = net.log[8]
+    assert (out.buffer_id, out.in_port, out.ports, out.data) == (ofp.OFP_NO_BUFFER, 1, [ofp.OFPP_TABLE], data)
+
+
+def test_miss_releases_buffered_packet_from_switch_buffer(net):
+    data = arp_frame(H1, H3, arp.ARP_REPLY, '10.0.0.1', '10.0.0.3')
+    packet_in(net, 1, 1, data[:rra.MISS_SEND_LEN], buffer_id=77, total_len=len(data))
+
+    outs = [msg for msg in net.log if msg.kind == 'packet_out']
+    assert len(outs) == 1
+    assert (outs[0].dpid, outs[0].buffer_id, outs[0].ports, outs[0].data) == (1, 77, [ofp.OFPP_TABLE], b'')
+
+
+def test_install_completes_once_every_switch_replies(net):
+    packet_in(net, 1, 1, arp_frame(H1, H3, arp.ARP_REPLY, '10.0.0.1', '10.0.0.3'))
+    install, hops = net.app._reactive_pending[H3]
+    assert hops == {1: 2, 2: 3, 3: 1}
+
+    reply_barriers(net, 3)
+    reply_barriers(net, 2)
+    assert install.finished is None
+    assert install.pending == {1: net.log[-1].xid}
+    reply_barriers(net, 1)
+    assert install.finished is not None
+    report = install.report()
+    assert report['complete']
+    # Barriers and the packet-out are not FlowMods
+    assert report['flow_mods'] == 6
+    assert report['switches'] == 3
+
+
+def test_miss_on_path_still_being_installed_follows_it(net):
+    packet_in(net, 1, 1, arp_frame(H1, H3, arp.ARP_REPLY, '10.0.0.1', '10.0.0.3'))
+    start = len(net.log)
+
+    # The packet reached sw2 before its barrier reply: forward it, don't install again
+    data = arp_frame(H1, H3, arp.ARP_REPLY, '10.0.0.1', '10.0.0.3')
+    packet_in(net, 2, 2, data)
+    assert kinds(net.log[start:]) == [(2, 'packet_out')]
+    out = net.log[start]
+    assert (out.buffer_id, out.in_port, out.ports, out.data) == (ofp.OFP_NO_BUFFER, 2, [3], data)
+
+    # Once applied everywhere, a miss means the rules are gone and the path is installed again
+    for dpid in (1, 2, 3):
+        reply_barriers(net, dpid)
+    start = len(net.log)
+    packet_in(net, 2, 2, data)
+    assert kinds(net.log[start:]) == [(3, 'flow_mod'), (3, 'barrier'),
+                                     (2, 'flow_mod'), (2, 'packet_out'), (2, 'barrier')]
+
+
+def test_flood_copies_to_edge_ports_only_and_learns_sender(net):
+    data = arp_frame(H1, BROADCAST, arp.ARP_REQUEST, '10.0.0.1', '10.0.0.3')
+    packet_in(net, 1, 1, data)
+
+    outs = {msg.dpid: msg for msg in net.log}
+    assert kinds(net.log) == [(1, 'packet_out'), (2, 'packet_out'), (3, 'packet_out')]
+    # Never back out of the ingress port nor onto a switch link
+    assert (outs[1].buffer_id, outs[1].in_port, outs[1].ports, outs[1].data) == \
+        (ofp.OFP_NO_BUFFER, 1, [3], data)
+    for dpid, ports in ((2, [1]), (3, [1, 3])):
+        assert (outs[dpid].buffer_id, outs[dpid].in_port, outs[dpid].ports, outs[dpid].data) == \
+            (ofp.OFP_NO_BUFFER, ofp.OFPP_CONTROLLER, ports, data)
+    assert net.app.hosts[H1]['dpid'] == 1 and net.app.hosts[H1]['port'] == 1
+
+    # The same packet again within FLOOD_DEDUP_WINDOW is dropped
+    del net.log[:]
+    packet_in(net, 1, 1, data)
+    assert net.log == []
+
+
+def test_flood_of_truncated_buffered_packet_stays_on_ingress(net):
+    data = arp_frame(H1, BROADCAST, arp.ARP_REQUEST, '10.0.0.1', '10.0.0.3')
+    packet_in(net, 1, 1, data[:20], buffer_id=5, total_len=len(data))
+
+    assert kinds(net.log) == [(1, 'packet_out')]
+    assert (net.log[0].buffer_id, net.log[0].ports, net.log[0].data) == (5, [3], b'')
+
+
+def test_flood_with_no_edge_port_left_still_frees_the_buffer(net):
+    # sw2's only edge port is the ingress one
+    data = arp_frame(H1, BROADCAST, arp.ARP_REQUEST, '10.0.0.1', '10.0.0.3')
+    packet_in(net, 2, 1, data[:20], buffer_id=9, total_len=len(data))
+    assert kinds(net.log) == [(2, 'packet_out')]
+    assert (net.log[0].buffer_id, net.log[0].ports) == (9, [])
+
+    # Unbuffered and truncated there is nothing to send at all
+    del net.log[:]
+    packet_in(net, 2, 1, data[:21], total_len=len(data))
+    assert net.log == []
+
+
+def test_ignores_packet_ins_of_other_apps_and_stray_flood_copies(net):
+    data = arp_frame(H1, BROADCAST, arp.ARP_REQUEST, '10.0.0.1', '10.0.0.3')
+    packet_in(net, 1, 1, data, cookie=0)
+    # A flood never goes out on a link, so one arriving from sw1 is a stray copy
+    packet_in(net, 2, 2, data)
+    assert net.log == []
+    assert H1 not in net.app.hosts
@@ -0,0 +1,161 @@
+"""
+Compact integer-indexed topology backend for the Ryu routing app.
+
+Switches get dense ids 0..n-1 in dpid order and links are held as CSR
+arrays (indptr/indices plus weight and bw columns). Routes for every
+source switch come from one batched scipy.sparse.csgraph call, and the
+predecessor matrix uses the same tie-break as routing_engine (lowest
+equal-cost dpid), so both backends return identical routes.
+"""
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import shortest_path
+
+from routing_engine import DIST_RTOL, backup_next_hop, host_attachments, tree_routes, uses_weights, weight_key
+
+NO_PRED = -9999  # scipy's own sentinel for "no predecessor"
+SOURCE_CHUNK = 256  # bounds the (sources x edges) scratch arrays
+
+
+class CSRTopology(object):
+    """Switch-level topology as CSR arrays with weight and bw columns."""
+
+    def __init__(self, nodes, indptr, indices, weight, bw):
+        self.nodes = nodes  # id -> dpid
+        self.index = {dpid: i for i, dpid in enumerate(nodes)}  # dpid -> id
+        self.indptr = indptr
+        self.indices = indices
+        self.weight = weight
+        self.bw = bw
+
+    @classmethod
+    def from_edges(cls, nodes, edges):
+        """Build from dpids and directed (src, dst, weight, bw) tuples."""
+        nodes = sorted(nodes)
+        index = {dpid: i for i, dpid in enumerate(nodes)}
+        n = len(nodes)
+        src = np.fromiter((index[e[0]] for e in edges), dtype=np.int32, count=len(edges))
+        dst = np.fromiter((index[e[1]] for e in edges), dtype=np.int32, count=len(edges))
+        weight = np.fromiter((e[2] for e in edges), dtype=np.float64, count=len(edges))
+        bw = np.fromiter((e[3] for e in edges), dtype=np.float64, count=len(edges))
+        order = np.lexsort((dst, src))
+        indptr = np.zeros(n + 1, dtype=np.int32)
+        np.add.at(indptr, src + 1, 1)
+        np.cumsum(indptr, out=indptr)
+        return cls(nodes, indptr, dst[order], weight[order], bw[order])
+
+    @classmethod
+    def from_graph(cls, graph, weight='weight'):
+        """Build from RoutingApp.net, keeping switch-to-switch links only.
+
+        ``weight`` names the edge attribute loaded into the weight column.
+        """
+        nodes = [n for n, d in graph.nodes(data=True) if d.get('type') != 'host']
+        switches = set(nodes)
+        edges = [(u, v, d.get(weight, 1.0), d.get('bw', 0.0))
+                 for u, v, d in graph.edges(data=True) if u in switches and v in switches]
+        return cls.from_edges(nodes, edges)
+
+    @property
+    def nbytes(self):
+        return self.indptr.nbytes + self.indices.nbytes + self.weight.nbytes + self.bw.nbytes
+
+    def matrix(self, mode):
+        n = len(self.nodes)
+        data = self.weight if uses_weights(mode) else np.ones_like(self.weight)
+        return csr_matrix((data, self.indices, self.indptr), shape=(n, n))
+
+    def shortest_paths(self, mode, sources=None):
+        """Return (source ids, dist, pred) for the given source dpids.
+
+        ``pred[k, v]`` is the lowest-id predecessor of v on any shortest
+        path from ``sources[k]``, or NO_PRED.
+        """
+        if sources is None:
+            src_ids = np.arange(len(self.nodes), dtype=np.int32)
+        else:
+            src_ids = np.array([self.index[s] for s in sources], dtype=np.int32)
+        n = len(self.nodes)
+        if n == 0 or len(src_ids) == 0:
+            return src_ids, np.zeros((len(src_ids), n)), np.full((len(src_ids), n), NO_PRED, dtype=np.int32)
+        hops = not uses_weights(mode)
+        dist = shortest_path(self.matrix(mode), method='D', directed=True, indices=src_ids, unweighted=hops)
+        dist = np.atleast_2d(dist)
+
+        # Edges grouped by head node so each group reduces to one predecessor
+        tail = np.repeat(np.arange(n, dtype=np.int32), np.diff(self.indptr))
+        order = np.lexsort((tail, self.indices))
+        u = tail[order]
+        v = self.indices[order]
+        w = np.ones(len(u)) if hops else self.weight[order]
+        pred = np.full((len(src_ids), n), NO_PRED, dtype=np.int32)
+        if len(u) == 0:
+            return src_ids, dist, pred
+        starts = np.flatnonzero(np.r_[True, v[1:] != v[:-1]])
+        heads = v[starts]
+        for lo in range(0, len(src_ids), SOURCE_CHUNK):
+            d = dist[lo:lo + SOURCE_CHUNK]
+            # Ties up to the same rounding slack as ShortestPathTree.build (dist_slack)
+            dv = d[:, v]
+            with np.errstate(invalid='ignore'):  # inf - inf where neither end is reachable
+                tight = np.isfinite(dv) & (np.abs(d[:, u] + w - dv) <= DIST_RTOL * np.maximum(1.0, np.abs(dv)))
+            cand = np.where(tight, u, n).astype(np.int32)
+            best = np.minimum.reduceat(cand, starts, axis=1)
+            pred[lo:lo + SOURCE_CHUNK, heads] = np.where(best == n, NO_PRED, best)
+        pred[np.arange(len(src_ids)), src_ids] = NO_PRED
+        return src_ids, dist, pred
+
+
+class MatrixTree(object):
+    """One predecessor-matrix row exposed like a ShortestPathTree."""
+
+    def __init__(self, topo, source, pred_row, dist_row, mode='dijkstra_bw'):
+        self.source = source
+        self.mode = mode
+        self._topo = topo
+        self._pred = pred_row.tolist()
+        self._dist = dist_row
+        self._paths = {topo.index[source]: [source]}
+
+    def distance(self, node):
+        idx = self._topo.index.get(node)
+        if idx is None or not np.isfinite(self._dist[idx]):
+            return None
+        return float(self._dist[idx])
+
+    def backup_next_hop(self, graph, node, primary, node_tree=None):
+        return backup_next_hop(graph, self, node, primary, node_tree)
+
+    def path_to(self, target):
+        idx = self._topo.index.get(target)
+        if idx is None:
+            return None
+        path = self._paths.get(idx)
+        if path is not None:
+            return path
+        if self._pred[idx] == NO_PRED:
+            return None
+        nodes = self._topo.nodes
+        rev = [target]
+        node = self._pred[idx]
+        while node not in self._paths:
+            rev.append(nodes[node])
+            node = self._pred[node]
+        path = self._paths[node] + rev[::-1]
+        self._paths[idx] = path
+        return path
+
+
+def csr_trees(topo, mode, sources):
+    """Batched shortest paths for ``sources`` as {dpid: MatrixTree}."""
+    sources = [s for s in sources if s in topo.index]
+    src_ids, dist, pred = topo.shortest_paths(mode, sources)
+    return {s: MatrixTree(topo, s, pred[k], dist[k], mode) for k, s in enumerate(sources)}
+
+
+def csr_routes(graph, mode, topo=None):
+    """Same result as routing_engine.tree_routes, computed on CSR arrays."""
+    if topo is None:
+        topo = CSRTopology.from_graph(graph, weight_key(mode) or 'weight')
+    sources = sorted({sw for _, sw in host_attachments(graph)})
+    return tree_routes(graph, mode, csr_trees(topo, mode, sources))